@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Asset Encoder - Encode images in every available lossless format, keep the smallest
+Each asset is tried as optimized PNG, exact indexed PNG and lossless WebP
+(when Pillow has the codec). The smallest PNG is always kept as the
+fallback, and a WebP is written alongside it only when it is smaller, so
+pages can serve it through <picture> or CSS image-set().
+"""
+
+from PIL import Image, features
+import io
+import numpy as np
+import os
+
+from build_cache import encode_png, hash_bytes, write_if_changed
+
+FORMATS = ('png', 'png8', 'webp')
+EXTENSIONS = {'png': '.png', 'png8': '.png', 'webp': '.webp'}
+MIME_TYPES = {'png': 'image/png', 'png8': 'image/png', 'webp': 'image/webp'}
+
+def available_formats(formats=FORMATS):
+    """The requested formats this Pillow build can actually encode"""
+    return [f for f in formats if f != 'webp' or features.check('webp')]
+
+def to_indexed(image):
+    """
+    Convert an image with at most 256 distinct RGBA colors to a P mode image
+    with a tRNS chunk, without losing anything. Returns None for images with
+    more colors.
+    """
+    if image.mode == 'P':
+        return image
+    rgba = np.asarray(image.convert('RGBA'))
+    packed = rgba.reshape(-1, 4).view(np.uint32).ravel()
+    colors, indices = np.unique(packed, return_inverse=True)
+    if len(colors) > 256:
+        return None
+
+    palette = colors.view(np.uint8).reshape(-1, 4)
+    indexed = Image.fromarray(indices.astype(np.uint8).reshape(rgba.shape[:2]), 'P')
+    indexed.putpalette(palette[:, :3].tobytes())
+    if (palette[:, 3] < 255).any():
+        indexed.info['transparency'] = palette[:, 3].tobytes()
+    return indexed
+
+def encode_candidates(image, formats=FORMATS):
+    """Encode an image in each available format; returns {format: bytes}"""
+    candidates = {}
+    for fmt in available_formats(formats):
+        if fmt == 'png':
+            candidates[fmt] = encode_png(image, optimize=True)
+        elif fmt == 'png8':
+            indexed = to_indexed(image)
+            if indexed is not None:
+                candidates[fmt] = encode_png(indexed, optimize=True)
+        elif fmt == 'webp':
+            candidates[fmt] = encode_webp(image)
+        else:
+            raise ValueError(f"Unknown image format: {fmt}")
+    return candidates
+
+def encode_webp(image):
+    """Lossless WebP bytes at the slowest, smallest setting"""
+    buffer = io.BytesIO()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    image.save(buffer, format='WEBP', lossless=True, quality=100, method=6, exact=True)
+    return buffer.getvalue()
+
+def existing_png(path, image):
+    """The bytes of the PNG at path if it decodes to exactly image's pixels, else None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        pixels = np.asarray(Image.open(io.BytesIO(data)).convert('RGBA'))
+    except OSError:
+        return None
+    return data if np.array_equal(pixels, np.asarray(image.convert('RGBA'))) else None
+
+def write_asset(image, path, formats=FORMATS):
+    """
+    Write the smallest lossless encodings of an image.
+
+    path is the asset's .png path. The smallest PNG (optimized or indexed)
+    is always written there; a WebP is written next to it when it beats
+    that PNG. Files whose bytes are unchanged are left alone, and a PNG
+    already at path with the same pixels is kept when it is no larger
+    (e.g. after optimize_pngs).
+
+    Returns an entry describing the outcome:
+        sizes: byte size of every candidate, plus 'default' for plain PNG
+        chosen: the smallest format overall
+        fallback: the PNG format written to path
+        files: {format: file name} of everything written
+        hashes: {file name: content hash}
+        written: number of files actually rewritten
+    """
+    candidates = encode_candidates(image, formats)
+    pngs = {fmt: data for fmt, data in candidates.items() if fmt != 'webp'}
+    if not pngs:
+        pngs['png'] = candidates['png'] = encode_png(image)
+
+    fallback = min(pngs, key=lambda fmt: len(pngs[fmt]))
+    existing = existing_png(path, image)
+    if existing is not None and len(existing) <= len(pngs[fallback]):
+        candidates[fallback] = pngs[fallback] = existing
+    chosen = min(candidates, key=lambda fmt: len(candidates[fmt]))
+
+    outputs = {fallback: path}
+    if chosen == 'webp':
+        outputs['webp'] = os.path.splitext(path)[0] + EXTENSIONS['webp']
+
+    entry = {
+        'sizes': {fmt: len(data) for fmt, data in candidates.items()},
+        'chosen': chosen,
+        'fallback': fallback,
+        'files': {},
+        'hashes': {},
+        'written': 0,
+    }
+    entry['sizes']['default'] = len(encode_png(image))
+    for fmt, output_path in outputs.items():
+        data = candidates[fmt]
+        filename = os.path.basename(output_path)
+        entry['files'][fmt] = filename
+        entry['hashes'][filename] = hash_bytes(data)
+        entry['written'] += write_if_changed(output_path, data)
+    return entry
+
+def picture_entry(entry, url_prefix):
+    """
+    A <picture>-ready description of a written asset: sources to try in
+    order, then the fallback src for the <img>
+    """
+    sources = []
+    if 'webp' in entry['files']:
+        sources.append({'srcset': f"{url_prefix}/{entry['files']['webp']}", 'type': MIME_TYPES['webp']})
+    fallback = entry['files'][entry['fallback']]
+    return {
+        'sources': sources,
+        'src': f"{url_prefix}/{fallback}",
+        'type': MIME_TYPES[entry['fallback']],
+        'bytes': entry['sizes'][entry['chosen']],
+    }
+
+def image_set_css(filename, webp, url_prefix):
+    """
+    background-image declaration preferring the WebP copy of a PNG asset
+    through image-set(), or an empty string when there is no WebP; the
+    plain url() of the PNG stays the fallback for older browsers
+    """
+    if not webp:
+        return ""
+    return (f"  background-image: image-set(url('{url_prefix}/{webp}') type('{MIME_TYPES['webp']}'), "
+            f"url('{url_prefix}/{filename}') type('{MIME_TYPES['png']}'));\n")
+
+def savings_report(entries):
+    """
+    Print how much each asset's chosen encoding saves over a default PNG.
+    entries is {name: entry}; returns (default_bytes, chosen_bytes).
+    """
+    total_default = 0
+    total_chosen = 0
+    for name, entry in entries.items():
+        default = entry['sizes']['default']
+        chosen = entry['sizes'][entry['chosen']]
+        total_default += default
+        total_chosen += chosen
+        print(f"  {name}: {default} -> {chosen} bytes as {entry['chosen']} "
+              f"({1 - chosen / default:.1%} smaller)")
+
+    if total_default:
+        print(f"Encoded {len(entries)} assets: {total_default} -> {total_chosen} bytes "
+              f"({total_default - total_chosen} bytes, {1 - total_chosen / total_default:.1%} saved)")
+    return total_default, total_chosen
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Build Cache - Content-hash manifest for incremental sprite builds
+Stages are keyed by a hash of their inputs and parameters, and output
+files are only rewritten when their bytes actually change, so a no-op
+rebuild touches nothing and file mtimes stay stable.
+"""
+
+import hashlib
+import io
+import json
+import os
+
+BUILD_MANIFEST = ".build_manifest.json"
+
+def hash_bytes(data):
+    """SHA-256 hex digest of some bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def build_key(*inputs, **params):
+    """Key for a build stage from its input hashes and parameters"""
+    payload = json.dumps({'inputs': inputs, 'params': params}, sort_keys=True)
+    return hash_bytes(payload.encode())
+
+def load_manifest(output_dir):
+    """Load the build manifest for output_dir, or an empty one"""
+    path = os.path.join(output_dir, BUILD_MANIFEST)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(output_dir, manifest):
+    """Save the build manifest for output_dir (only if it changed)"""
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode()
+    write_if_changed(os.path.join(output_dir, BUILD_MANIFEST), data)
+
+def stage_is_current(manifest, stage, key, output_dir):
+    """
+    True when the stage was last built with the same key and all of its
+    recorded outputs are still on disk with the recorded contents
+    """
+    entry = manifest.get(stage)
+    if not entry or entry.get('key') != key:
+        return False
+
+    for filename, digest in entry.get('outputs', {}).items():
+        path = os.path.join(output_dir, filename)
+        if not os.path.exists(path) or hash_file(path) != digest:
+            return False
+    return True
+
+def encode_png(image, **save_options):
+    """Encode an image to PNG bytes in memory"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', **save_options)
+    return buffer.getvalue()
+
+def write_if_changed(path, data):
+    """
+    Write bytes to path unless the file already holds exactly those bytes.
+    Returns True if the file was written.
+    """
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Decode Cache - Persistent memory-mapped arrays for sprite sheet analysis
+The decoded pixels, foreground mask and component labeling of a sheet are
+saved as .npy files keyed by the source hash and the parameters that
+produced them. Later runs memory-map them instead of decoding and labeling
+again, so they start almost at once and concurrent processes share the
+same pages. The cache is opt-in and bounded: once it grows past its byte
+limit the least recently used files are deleted.
+"""
+
+from PIL import Image
+import json
+import os
+import numpy as np
+
+from build_cache import build_key, hash_file
+from sheet_analysis import SheetAnalysis
+
+DEFAULT_CACHE_DIR = ".sheet_cache"
+DEFAULT_MAX_BYTES = 512 * 2**20
+
+# Bump whenever decoding, masking or labeling changes what they produce,
+# so arrays cached by older code are never served again
+CACHE_VERSION = 1
+
+def save_array_atomic(path, array):
+    """Save an .npy file under a temporary name and rename it into place"""
+    temp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(temp_path, array)
+    os.replace(temp_path, path)
+
+def load_array(path):
+    """
+    Memory-map a cached .npy file read-only, or None if it is missing or
+    unreadable. A hit refreshes the file's mtime for prune_cache.
+    """
+    try:
+        array = np.load(path, mmap_mode='r')
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return array
+
+def prune_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """Delete the least recently used cache files until at most max_bytes remain"""
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if entry.is_file():
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+    return total
+
+def open_analysis(image_path, cache_dir=None, **options):
+    """
+    SheetAnalysis of a sheet, backed by the decode cache in cache_dir when
+    one is given; options go to the analysis
+    """
+    if cache_dir:
+        return CachedSheetAnalysis(image_path, cache_dir=cache_dir, **options)
+    return SheetAnalysis(image_path, **options)
+
+class CachedSheetAnalysis(SheetAnalysis):
+    """
+    A SheetAnalysis whose decode, mask and labeling persist in cache_dir.
+
+    Each array is looked up under a key built from the source hash and
+    the parameters it depends on; a hit is memory-mapped read-only, a miss
+    is computed as usual and saved for the next run. The PIL image is
+    only opened when something still needs it (e.g. a GIF's transparency
+    index in palette mode).
+
+    Args are as for SheetAnalysis (image must be a path), plus:
+        cache_dir: Directory holding the cached .npy files
+        source_hash: Content hash of the sheet if the caller already has it
+        max_bytes: Size the cache directory is pruned back to after a miss
+    """
+
+    def __init__(self, image_path, background_color=None, tolerance=10, connectivity=8,
+                 background_mode='histogram', palette=False, cache_dir=DEFAULT_CACHE_DIR,
+                 source_hash=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = image_path
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.source_hash = source_hash or hash_file(image_path)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # The header alone gives the size and mode; pixels come from the cache
+        self._image = Image.open(image_path)
+        self.width, self.height = self._image.size
+        self.palette = None
+        self.indices = None
+        self._pixels = None
+        palette = bool(palette and self._image.mode == 'P')
+        self.decode_key = build_key(self.source_hash, palette=palette, version=CACHE_VERSION)
+        if palette:
+            self.indices = self._cached('indices', self.decode_key, lambda: np.array(self.image))
+            self.palette = self._cached('palette', self.decode_key,
+                                        lambda: np.array(self.image.getpalette(),
+                                                         dtype=np.uint8).reshape(-1, 3))
+
+        self._init_state(background_color, tolerance, connectivity, background_mode)
+
+    @property
+    def image(self):
+        """The PIL image, decoded by PIL only if something asks for its pixels"""
+        return self._image
+
+    def _path(self, name, key, extension='npy'):
+        return os.path.join(self.cache_dir, f"{key}.{name}.{extension}")
+
+    def _cached(self, name, key, compute):
+        """Memory-map the cached array for key, computing and saving it on a miss"""
+        path = self._path(name, key)
+        array = load_array(path)
+        if array is None:
+            save_array_atomic(path, compute())
+            array = np.load(path, mmap_mode='r')
+            prune_cache(self.cache_dir, self.max_bytes)
+        return array
+
+    @property
+    def pixels(self):
+        """RGBA pixel array, memory-mapped from the cache"""
+        if self._pixels is None:
+            key = build_key(self.source_hash, palette=False, version=CACHE_VERSION)
+            self._pixels = self._cached('rgba', key, lambda: np.array(self.image.convert('RGBA')))
+        return self._pixels
+
+    @property
+    def background_color(self):
+        """Background (r, g, b), detected once per source and mode"""
+        if self._background_color is None:
+            path = self._path('background', build_key(self.decode_key, mode=self.background_mode),
+                              'json')
+            try:
+                with open(path) as f:
+                    cached = json.load(f)
+                self._background_color = tuple(cached['color'])
+                self.background_confidence = cached['confidence']
+            except (OSError, ValueError, KeyError):
+                SheetAnalysis.background_color.fget(self)
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w') as f:
+                    json.dump({'color': list(self._background_color),
+                               'confidence': self.background_confidence}, f)
+                os.replace(temp_path, path)
+        return self._background_color
+
+    @property
+    def mask_key(self):
+        """Cache key of the foreground mask"""
+        return build_key(self.decode_key, background=list(self.background_color),
+                         tolerance=self.tolerance)
+
+    @property
+    def mask(self):
+        """Boolean foreground mask, memory-mapped from the cache"""
+        if self._mask is None:
+            self._mask = self._cached('mask', self.mask_key,
+                                      lambda: SheetAnalysis.mask.fget(self))
+        return self._mask
+
+    @property
+    def components(self):
+        """Connected components of the mask, with their arrays memory-mapped from the cache"""
+        if self._components is None:
+            key = build_key(self.mask_key, connectivity=self.connectivity)
+            paths = [self._path(name, key) for name in ('bounds', 'areas', 'runs')]
+            arrays = [load_array(path) for path in paths]
+            if any(array is None for array in arrays):
+                components = SheetAnalysis.components.fget(self)
+                runs = np.stack(components['runs'] + (components['run_labels'],))
+                for path, array in zip(paths, (components['bounds'], components['areas'], runs)):
+                    save_array_atomic(path, array)
+                arrays = [np.load(path, mmap_mode='r') for path in paths]
+                prune_cache(self.cache_dir, self.max_bytes)
+
+            bounds, areas, runs = arrays
+            self._components = {
+                'count': len(bounds),
+                'bounds': bounds,
+                'areas': areas,
+                'runs': (runs[0], runs[1], runs[2]),
+                'run_labels': runs[3],
+            }
+        return self._components
+
+    @property
+    def labels(self):
+        """Label image, memory-mapped from the cache"""
+        if self._labels is None:
+            key = build_key(self.mask_key, connectivity=self.connectivity)
+            self._labels = self._cached('labels', key, lambda: SheetAnalysis.labels.fget(self))
+        return self._labels
+
+    def content_hash(self):
+        """Hash of the source file, as given or computed once at construction"""
+        return self.source_hash
@@ -4,69 +4,52 @@ Automatically detect and extract individual plane sprites without manual selecti
 Uses connected component analysis to find isolated sprites.
 """
 
-from PIL import Image
 import numpy as np
-from scipy import ndimage
+import argparse
 import os
+import sys
 
-def detect_individual_sprites(image_path, bg_color_hex='#ABD4E6'):
+# Shared extraction helpers live in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from decode_cache import open_analysis
+from pipeline_stats import PipelineStats
+from sheet_analysis import SheetAnalysis
+from sprite_animation import animation_css, build_strip, cluster_rows, find_sequences
+from sprite_sheet import SpriteSheet
+
+def detect_individual_sprites(image_path, bg_color_hex='#ABD4E6', analysis=None):
     """
     Automatically detect individual sprites using connected component analysis.
+    Pass a SheetAnalysis to reuse an already decoded and labeled sheet.
     """
-    # Open image
-    img = Image.open(image_path)
-    if img.mode != 'RGBA':
-        img = img.convert('RGBA')
-    
-    # Convert to numpy array
-    img_array = np.array(img)
-    
-    # Convert bg color to RGB
-    bg_color = tuple(int(bg_color_hex[i:i+2], 16) for i in (1, 3, 5))
+    if analysis is None:
+        analysis = SheetAnalysis(image_path, bg_color_hex, connectivity=4)
+    img = analysis.image
     
-    # Create binary mask (1 for sprite pixels, 0 for background)
-    mask = np.zeros((img.height, img.width), dtype=bool)
+    # Bounding boxes and pixel counts of every connected component of the
+    # foreground mask, computed in a single labeling pass
+    components = analysis.components
+    min_x, min_y, max_x, max_y = components['bounds'].T
+    widths = max_x - min_x + 1
+    heights = max_y - min_y + 1
+    fill_ratios = components['areas'] / (widths * heights)
     
-    for y in range(img.height):
-        for x in range(img.width):
-            r, g, b, a = img_array[y, x]
-            # Check if NOT background
-            if not (abs(r - bg_color[0]) < 10 and abs(g - bg_color[1]) < 10 and abs(b - bg_color[2]) < 10):
-                mask[y, x] = True
+    # Filter out very small components (noise) and very large ones (multiple sprites)
+    keep = (30 < widths) & (widths < 120) & (30 < heights) & (heights < 120)
     
-    # Find connected components
-    labeled_array, num_features = ndimage.label(mask)
+    # Check if this looks like a complete plane (at least 20% filled)
+    keep &= fill_ratios > 0.2
     
-    # Get bounding boxes for each component
     sprites = []
-    for i in range(1, num_features + 1):
-        # Find pixels belonging to this component
-        component_mask = labeled_array == i
-        
-        # Get bounding box
-        rows, cols = np.where(component_mask)
-        if len(rows) > 0 and len(cols) > 0:
-            y_min, y_max = rows.min(), rows.max()
-            x_min, x_max = cols.min(), cols.max()
-            
-            width = x_max - x_min + 1
-            height = y_max - y_min + 1
-            
-            # Filter out very small components (noise) and very large ones (multiple sprites)
-            if 30 < width < 120 and 30 < height < 120:
-                # Check if this looks like a complete plane (has enough pixels)
-                pixel_count = np.sum(component_mask)
-                fill_ratio = pixel_count / (width * height)
-                
-                if fill_ratio > 0.2:  # At least 20% filled
-                    sprites.append({
-                        'x': x_min,
-                        'y': y_min,
-                        'width': width,
-                        'height': height,
-                        'pixel_count': pixel_count,
-                        'fill_ratio': fill_ratio
-                    })
+    for i in np.flatnonzero(keep):
+        sprites.append({
+            'x': int(min_x[i]),
+            'y': int(min_y[i]),
+            'width': int(widths[i]),
+            'height': int(heights[i]),
+            'pixel_count': int(components['areas'][i]),
+            'fill_ratio': float(fill_ratios[i])
+        })
     
     return sprites, img
 
@@ -74,22 +57,18 @@ def find_best_plane_sprites(sprites):
     """
     From all detected sprites, find the best plane sprites for each row.
     Looking specifically for planes with thrust (usually in columns 4-7).
+    Every sprite gets a 'row' index from clustering the sheet's rows.
     """
-    # Group sprites by approximate row
-    rows = {}
-    for sprite in sprites:
-        row_y = sprite['y'] // 100 * 100  # Group by 100px rows
-        if row_y not in rows:
-            rows[row_y] = []
-        rows[row_y].append(sprite)
+    # Group sprites into the sheet's rows (each row comes back sorted by X)
+    rows = cluster_rows(sprites)
+    for row_index, row_sprites in enumerate(rows):
+        for sprite in row_sprites:
+            sprite['row'] = row_index
     
     # For each row, find sprites that look like planes with thrust
     best_sprites = []
     
-    for row_y, row_sprites in sorted(rows.items()):
-        # Sort by X position
-        row_sprites.sort(key=lambda s: s['x'])
-        
+    for row_sprites in rows:
         # Look for sprites in the thrust columns (roughly x=300-800)
         thrust_sprites = [s for s in row_sprites if 300 < s['x'] < 800]
         
@@ -107,37 +86,39 @@ def find_best_plane_sprites(sprites):
     
     return best_sprites
 
-def extract_sprite(img, x, y, width, height, bg_color_hex='#ABD4E6'):
-    """Extract a sprite and make background transparent."""
-    # Convert hex color to RGB
-    bg_color = tuple(int(bg_color_hex[i:i+2], 16) for i in (1, 3, 5))
-    
-    # Crop the region
-    sprite = img.crop((x, y, x + width, y + height))
-    
-    # Make background transparent
-    sprite = sprite.convert('RGBA')
-    pixels = sprite.load()
-    
-    for i in range(sprite.width):
-        for j in range(sprite.height):
-            r, g, b, a = pixels[i, j]
-            if abs(r - bg_color[0]) < 10 and abs(g - bg_color[1]) < 10 and abs(b - bg_color[2]) < 10:
-                pixels[i, j] = (r, g, b, 0)
-    
-    return sprite
-
-def main():
+def main(stats=None, decode_cache=None):
+    """
+    Detect, select and export the plane sprites; pass a PipelineStats to time
+    each stage, and a directory as decode_cache to reuse cached decodes
+    """
+    stats = stats or PipelineStats(enabled=False)
     sprite_sheet = 'images/planes_spritesheet.gif'
     
     print("Automatically detecting plane sprites...")
     
+    # Decode and label the sheet once for the whole run
+    with stats.stage('decode'):
+        analysis = open_analysis(sprite_sheet, decode_cache, background_color='#ABD4E6',
+                                 connectivity=4)
+    with stats.stage('mask'):
+        analysis.mask
+    with stats.stage('labeling'):
+        analysis.components
+    
+    # Keyed crops are cached, so frames shared by the planes and strips are cut once
+    sheet = SpriteSheet(analysis, clear_color=False)
+    
     # Detect all sprites
-    sprites, img = detect_individual_sprites(sprite_sheet)
+    with stats.stage('detect'):
+        sprites, img = detect_individual_sprites(sprite_sheet, analysis=analysis)
     print(f"Found {len(sprites)} potential sprites")
+    stats.count('pixels_scanned', analysis.width * analysis.height)
+    stats.count('components_found', analysis.components['count'])
+    stats.count('components_filtered', analysis.components['count'] - len(sprites))
     
     # Find the best plane sprites
-    best_sprites = find_best_plane_sprites(sprites)
+    with stats.stage('select'):
+        best_sprites = find_best_plane_sprites(sprites)
     print(f"Selected {len(best_sprites)} best plane sprites")
     
     # Create output directory
@@ -156,7 +137,7 @@ def main():
         used_rows = set()
         
         for sprite in best_sprites:
-            row = sprite['y'] // 100
+            row = sprite['row']
             if row not in used_rows and len(selected) < 5:
                 selected.append(sprite)
                 used_rows.add(row)
@@ -172,9 +153,13 @@ def main():
             plane_num = i + 2  # nth-child(2) through nth-child(6)
             
             # Extract and save the sprite
-            extracted = extract_sprite(img, sprite['x'], sprite['y'], 
-                                     sprite['width'], sprite['height'])
-            extracted.save(f"auto_sprites/plane_{plane_num}.png")
+            with stats.stage('keying'):
+                extracted = sheet.crop(sprite['x'], sprite['y'], sprite['width'], sprite['height'])
+            output_path = f"auto_sprites/plane_{plane_num}.png"
+            with stats.stage('encode'):
+                extracted.save(output_path)
+            stats.count('sprites_written')
+            stats.count('bytes_written', os.path.getsize(output_path))
             
             css_output += f"""
     .plane:nth-child({plane_num}) {{
@@ -190,17 +175,62 @@ def main():
                   f"size={sprite['width']}x{sprite['height']}")
     
     # Save CSS
-    with open('auto_sprite_positions.css', 'w') as f:
-        f.write(css_output + '\n')
+    with stats.stage('css'):
+        with open('auto_sprite_positions.css', 'w') as f:
+            f.write(css_output + '\n')
+    stats.count('bytes_written', len(css_output) + 1)
     
     print("\nCSS saved to auto_sprite_positions.css")
     print("Individual sprites saved to auto_sprites/")
     
+    # One strip per animation sequence replaces a stack of frame images
+    with stats.stage('strips'):
+        animations = export_animation_strips(sheet, sprites)
+    stats.count('animation_strips', len(animations))
+    
     # Also save a preview HTML
-    create_preview_html(selected[:5])
+    with stats.stage('preview'):
+        create_preview_html(selected[:5], animations)
 
-def create_preview_html(sprites):
-    """Create a preview of the auto-detected sprites."""
+def export_animation_strips(sheet, sprites, output_dir='auto_sprites',
+                            css_path='auto_sprite_animations.css'):
+    """
+    Find the animation sequences in each row of detected sprites, save each
+    one as a horizontal strip and write steps() animation CSS for them.
+    Frames are cropped through sheet (a SpriteSheet), so frames already
+    keyed for the plane files come from its cache.
+    Returns one dict per sequence (css_class, file, frames, cell size, CSS).
+    """
+    animations = []
+    css_output = "/* Automatically detected plane animations */\n\n"
+    for row_sprites in cluster_rows(sprites):
+        for sequence in find_sequences(row_sprites):
+            frames = [sheet.crop(s['x'], s['y'], s['width'], s['height']) for s in sequence]
+            strip, cell_width, cell_height = build_strip(frames)
+            
+            n = len(animations) + 1
+            strip_path = f"{output_dir}/plane_anim_{n}.png"
+            strip.save(strip_path)
+            css = animation_css(f"plane-anim-{n}", strip_path, cell_width, cell_height, len(frames))
+            css_output += css
+            animations.append({
+                'css_class': f"plane-anim-{n}",
+                'file': strip_path,
+                'frames': len(frames),
+                'cell_width': cell_width,
+                'cell_height': cell_height,
+                'css': css,
+            })
+            print(f"Animation {n}: {len(frames)} frames of {cell_width}x{cell_height} "
+                  f"from row at y={sequence[0]['y']} -> {strip_path}")
+    
+    with open(css_path, 'w') as f:
+        f.write(css_output)
+    print(f"Animation CSS saved to {css_path}")
+    return animations
+
+def create_preview_html(sprites, animations=()):
+    """Create a preview of the auto-detected sprites and animation strips."""
     html = """<!DOCTYPE html>
 <html>
 <head>
@@ -226,7 +256,12 @@ def create_preview_html(sprites):
             image-rendering: pixelated;
             display: block;
         }
-    </style>
+"""
+    
+    for animation in animations:
+        html += animation['css']
+    
+    html += """    </style>
 </head>
 <body>
     <h1>Auto-Detected Plane Sprites</h1>
@@ -243,6 +278,20 @@ def create_preview_html(sprites):
             Pos: ({sprite['x']}, {sprite['y']})</p>
         </div>"""
     
+    html += """
+    </div>
+    <h2>Animations</h2>
+    <div class="preview">
+"""
+    
+    for animation in animations:
+        html += f"""
+        <div class="sprite-box">
+            <div class="{animation['css_class']}"></div>
+            <p>{animation['css_class']}<br>
+            {animation['frames']} frames, one element</p>
+        </div>"""
+    
     html += """
     </div>
     <h2>How these were detected:</h2>
@@ -251,6 +300,7 @@ def create_preview_html(sprites):
         <li>Filtered by size (30-120px) and fill ratio (>20%)</li>
         <li>Selected sprites from thrust columns (x=300-800)</li>
         <li>Chose diverse sprites from different rows</li>
+        <li>Clustered rows by vertical overlap; same-sized neighbours form an animation strip</li>
     </ul>
 </body>
 </html>"""
@@ -259,4 +309,20 @@ def create_preview_html(sprites):
         f.write(html)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Auto-detect and extract plane sprites")
+    parser.add_argument('--stats', metavar='FILE',
+                        help="Write per-stage wall/CPU time and counters as JSON")
+    parser.add_argument('--profile-stage', metavar='STAGE',
+                        help="Run one stage (decode, mask, labeling, detect, select, "
+                             "keying, encode, css, strips, preview) under cProfile")
+    parser.add_argument('--profile-out', metavar='FILE',
+                        help="Save the --profile-stage profile here instead of printing it")
+    parser.add_argument('--decode-cache', metavar='DIR',
+                        help="Memory-map decoded pixels, masks and labels cached in DIR (off by default)")
+    args = parser.parse_args()
+    
+    stats = PipelineStats(enabled=bool(args.stats or args.profile_stage),
+                          profile_stage=args.profile_stage, profile_path=args.profile_out)
+    main(stats, args.decode_cache)
+    if args.stats:
+        stats.write(args.stats)
\ No newline at end of file
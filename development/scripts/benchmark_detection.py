@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Benchmark every sprite detection path on seeded synthetic sprite sheets.
+Times each backend, records peak memory and checks that the detected
+bounds agree, then writes a machine-readable results table.
+Usage: python development/scripts/benchmark_detection.py [--sizes 512 1024 ...]
+"""
+
+from PIL import Image
+import numpy as np
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Shared extraction helpers live in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sheet_analysis import SheetAnalysis
+from sprite_extractor import find_sprite_bounds_reference
+from sprite_labeling import foreground_mask, label_components
+from sprite_segmentation import xy_cut
+
+try:
+    from scipy import ndimage
+except ImportError:
+    ndimage = None
+
+BACKGROUND = (171, 212, 230)
+
+# Index 0 is the background, the rest are sprite colors
+PALETTE = [BACKGROUND, (40, 40, 48), (96, 104, 112), (200, 60, 40),
+           (240, 200, 64), (232, 232, 232), (64, 120, 64), (24, 72, 160)]
+
+def generate_sheet(size, density=0.5, noise=0.0, cell=64, seed=0):
+    """
+    Generate a size x size indexed sprite sheet.
+
+    Sprites are blobs (an ellipse body with a rectangular fuselage) in a
+    grid of cell x cell slots; density is the share of occupied slots and
+    noise the share of pixels replaced by isolated specks.
+    Returns (image, sprite_count)
+    """
+    rng = np.random.default_rng(seed)
+    sheet = np.zeros((size, size), dtype=np.uint8)
+    cells = size // cell
+    occupied = np.argwhere(rng.random((cells, cells)) < density)
+
+    gutter = 4
+    yy, xx = np.mgrid[0:cell - 2 * gutter, 0:cell - 2 * gutter]
+    for row, col in occupied:
+        h, w = rng.integers(cell // 4, cell - 2 * gutter, size=2)
+        cy, cx = (h - 1) / 2, (w - 1) / 2
+        body = ((yy - cy) / (h / 2)) ** 2 + ((xx - cx) / (w / 2)) ** 2 <= 1
+        fuselage = (np.abs(xx - cx) <= max(1, w // 8)) & (yy < h)
+        blob = body | fuselage
+        colors = rng.integers(1, len(PALETTE), size=blob.shape, dtype=np.uint8)
+
+        y0, x0 = row * cell + gutter, col * cell + gutter
+        window = sheet[y0:y0 + blob.shape[0], x0:x0 + blob.shape[1]]
+        window[blob] = colors[blob]
+
+    if noise > 0:
+        specks = rng.random((size, size)) < noise
+        sheet[specks] = rng.integers(1, len(PALETTE), size=int(specks.sum()), dtype=np.uint8)
+
+    image = Image.fromarray(sheet, 'P')
+    image.putpalette([channel for color in PALETTE for channel in color])
+    return image, len(occupied)
+
+def detect_flood_fill(image):
+    """The pure-Python flood fill in sprite_extractor.find_sprite_bounds"""
+    return find_sprite_bounds_reference(image.convert('RGB'), BACKGROUND, min_size=0)
+
+def detect_numpy_runs(image):
+    """Run-based NumPy labeling on an RGB decode"""
+    mask = foreground_mask(image.convert('RGB'), BACKGROUND)
+    return [tuple(b) for b in label_components(mask)['bounds'].tolist()]
+
+def detect_numpy_palette(image):
+    """Run-based NumPy labeling straight from palette indices"""
+    analysis = SheetAnalysis(image, BACKGROUND, palette=True)
+    return analysis.sprite_bounds(min_size=0)
+
+def detect_ndimage(image):
+    """
+    scipy.ndimage.label with 8-connectivity like the other backends
+    (detect_individual_sprites itself labels with 4-connectivity)
+    """
+    mask = foreground_mask(image.convert('RGB'), BACKGROUND)
+    labeled, _ = ndimage.label(mask, structure=np.ones((3, 3)))
+    bounds = []
+    for rows, cols in ndimage.find_objects(labeled):
+        bounds.append((cols.start, rows.start, cols.stop - 1, rows.stop - 1))
+    return bounds
+
+def detect_xy_cut(image):
+    """Recursive XY-cut on occupancy profiles of an RGB-decoded mask"""
+    return xy_cut(foreground_mask(image.convert('RGB'), BACKGROUND))
+
+def detect_column_projection(image, band=64):
+    """
+    The column scan from identify_sprites_in_row: for each horizontal band,
+    walk every column pixel by pixel looking for content, split on gaps of
+    more than 5 columns, then take the vertical extent of each group
+    """
+    rgb = image.convert('RGB')
+    pixels = rgb.load()
+    bounds = []
+
+    def is_background(color):
+        return all(abs(c1 - c2) < 10 for c1, c2 in zip(color, BACKGROUND))
+
+    for band_y in range(0, rgb.height, band):
+        band_end = min(rgb.height, band_y + band)
+        columns = []
+        for x in range(rgb.width):
+            for y in range(band_y, band_end):
+                if not is_background(pixels[x, y]):
+                    columns.append(x)
+                    break
+
+        groups = []
+        for x in columns:
+            if groups and x - groups[-1][1] <= 5:
+                groups[-1][1] = x
+            else:
+                groups.append([x, x])
+
+        for start_x, end_x in groups:
+            rows = [y for y in range(band_y, band_end)
+                    if any(not is_background(pixels[x, y]) for x in range(start_x, end_x + 1))]
+            bounds.append((start_x, rows[0], end_x, rows[-1]))
+
+    return bounds
+
+BACKENDS = {
+    'flood_fill': (detect_flood_fill, True),
+    'numpy_runs': (detect_numpy_runs, False),
+    'numpy_palette': (detect_numpy_palette, False),
+    'ndimage': (detect_ndimage, False),
+    'column_projection': (detect_column_projection, True),
+    'xy_cut': (detect_xy_cut, False),
+}
+
+def measure(detect, image):
+    """
+    Run one detector twice, returning (bounds, wall seconds, peak traced MB):
+    timed without tracing, since tracemalloc slows pure-Python code several
+    times over, then again under tracemalloc for the memory peak
+    """
+    start = time.perf_counter()
+    bounds = detect(image)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    detect(image)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return bounds, elapsed, peak / 2**20
+
+def agreement(bounds, reference):
+    """Jaccard overlap between a backend's bounds and the reference bounds"""
+    if not reference:
+        return 1.0 if not bounds else 0.0
+    found = set(map(tuple, bounds))
+    return len(found & set(map(tuple, reference))) / max(len(found | set(map(tuple, reference))), 1)
+
+def version_info():
+    """Identify the code and libraries a result set was produced with"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': getattr(sys.modules.get('scipy'), '__version__', None),
+    }
+
+def run_benchmarks(sizes, densities, noises, backends, seed=0, python_limit=1024):
+    """Benchmark every backend on every synthetic sheet, returning result rows"""
+    results = []
+    for size in sizes:
+        for density in densities:
+            for noise in noises:
+                image, sprite_count = generate_sheet(size, density, noise, seed=seed)
+                reference = None
+                for name in backends:
+                    detect, pure_python = BACKENDS[name]
+                    row = {
+                        'size': size, 'density': density, 'noise': noise, 'seed': seed,
+                        'sprites': sprite_count, 'backend': name,
+                    }
+                    if pure_python and size > python_limit:
+                        row['skipped'] = f"pure-Python backend limited to {python_limit}px"
+                    elif name == 'ndimage' and ndimage is None:
+                        row['skipped'] = "scipy not installed"
+                    else:
+                        bounds, elapsed, peak_mb = measure(detect, image)
+                        if reference is None:
+                            reference = bounds
+                        row.update({
+                            'seconds': round(elapsed, 4),
+                            'peak_mb': round(peak_mb, 2),
+                            'components': len(bounds),
+                            'mpixels_per_s': round(size * size / elapsed / 1e6, 2),
+                            'agreement': round(agreement(bounds, reference), 4),
+                        })
+                    results.append(row)
+                    print(format_row(row))
+    return results
+
+def format_row(row):
+    """One human-readable line per result"""
+    label = f"{row['size']:>6}px d={row['density']:<4} n={row['noise']:<6} {row['backend']:<18}"
+    if 'skipped' in row:
+        return f"{label} skipped ({row['skipped']})"
+    return (f"{label} {row['seconds']:>9.4f}s {row['peak_mb']:>9.1f}MB "
+            f"{row['components']:>8} comps  agreement {row['agreement']:.2%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sprite detection backends")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 1024, 2048, 4096, 8192],
+                        help="Sheet sizes to generate; 16384 needs several GB of memory")
+    parser.add_argument('--densities', type=float, nargs='+', default=[0.2, 0.8])
+    parser.add_argument('--noise', type=float, nargs='+', default=[0.0, 0.001])
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS),
+                        default=['numpy_runs', 'numpy_palette', 'ndimage', 'flood_fill', 'column_projection',
+                                 'xy_cut'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--python-limit', type=int, default=1024,
+                        help="Largest sheet size the pure-Python backends are run on")
+    parser.add_argument('-o', '--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.densities, args.noise, args.backends,
+                             args.seed, args.python_limit)
+
+    with open(args.output, 'w') as f:
+        json.dump({'version': version_info(), 'results': results}, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()
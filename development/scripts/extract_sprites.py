@@ -5,7 +5,21 @@ Usage: python extract_sprites.py
 """
 
 from PIL import Image
+import argparse
 import os
+import sys
+
+# Shared extraction helpers live in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from decode_cache import open_analysis
+from sheet_analysis import SheetAnalysis
+from sprite_animation import animation_css, build_strip
+from sprite_grid import axis_cells
+from sprite_segmentation import xy_cut
+from sprite_sheet import SpriteSheet
+
+# One lazily decoded sheet per (path, background color), shared by every call
+_sheets = {}
 
 def extract_sprite(image_path, x, y, width, height, bg_color_hex='#ABD4E6'):
     """
@@ -18,91 +32,49 @@ def extract_sprite(image_path, x, y, width, height, bg_color_hex='#ABD4E6'):
         bg_color_hex: Background color to make transparent (default: #ABD4E6)
     
     Returns:
-        PIL Image with transparent background
+        PIL Image with transparent background (cached; treat as read-only)
     """
-    # Open the sprite sheet
-    img = Image.open(image_path)
-    
-    # Convert to RGBA if not already
-    if img.mode != 'RGBA':
-        img = img.convert('RGBA')
-    
-    # Crop the region
-    sprite = img.crop((x, y, x + width, y + height))
-    
-    # Convert hex color to RGB
-    bg_color = tuple(int(bg_color_hex[i:i+2], 16) for i in (1, 3, 5))
-    
-    # Get pixel data
-    pixels = sprite.load()
-    
-    # Make background transparent
-    for i in range(sprite.width):
-        for j in range(sprite.height):
-            r, g, b, a = pixels[i, j]
-            # Check if pixel matches background color (with some tolerance)
-            if abs(r - bg_color[0]) < 5 and abs(g - bg_color[1]) < 5 and abs(b - bg_color[2]) < 5:
-                pixels[i, j] = (r, g, b, 0)  # Make transparent
-    
-    return sprite
+    # The sheet is decoded once and repeated crops come from its LRU cache
+    key = (image_path, bg_color_hex)
+    if key not in _sheets:
+        # Pixels within 10 of the background color become transparent
+        _sheets[key] = SpriteSheet(image_path, bg_color_hex, clear_color=False)
+    return _sheets[key].crop(x, y, width, height)
 
-def find_single_sprite_bounds(img, x_center, row_y, bg_color):
-    """
-    Find bounds of a single sprite centered around x_center, carefully isolating it.
-    
-    Returns: (x, y, width, height) of the isolated sprite
+def find_cell_sprite_bounds(analysis, row_bands, row, column, padding=2):
     """
-    pixels = img.load()
-    
-    # Each sprite is roughly 64-100px wide, so search in that range
-    search_width = 60
-    x_start = max(0, x_center - search_width)
-    x_end = min(img.width, x_center + search_width)
-    
-    # For Y, planes typically span 50-90px in actual height
-    # Start from the expected row position and search up/down
-    y_search_start = row_y - 20
-    y_search_end = row_y + 90
-    
-    # Find the actual plane bounds within this restricted area
-    # First find the main body of the plane (densest pixel area)
-    top_y = y_search_end
-    bottom_y = y_search_start
-    left_x = x_end
-    right_x = x_start
-    
-    # Scan for the main body
-    for y in range(y_search_start, y_search_end):
-        row_has_content = False
-        for x in range(x_start, x_end):
-            if 0 <= x < img.width and 0 <= y < img.height:
-                r, g, b, a = pixels[x, y]
-                if not (abs(r - bg_color[0]) < 10 and abs(g - bg_color[1]) < 10 and abs(b - bg_color[2]) < 10):
-                    if y < top_y:
-                        top_y = y
-                    if y > bottom_y:
-                        bottom_y = y
-                    if x < left_x:
-                        left_x = x
-                    if x > right_x:
-                        right_x = x
-                    row_has_content = True
+    Find bounds of the sprite in one cell of the sheet, by row band and
+    grid column, without any hand-measured coordinates.
     
-    # Add small padding but constrain to avoid neighboring sprites
-    padding = 2
-    left_x = max(x_start, left_x - padding)
-    right_x = min(x_end, right_x + padding)
-    top_y = max(y_search_start, top_y - padding)
-    bottom_y = min(y_search_end, bottom_y + padding)
+    Args:
+        analysis: SheetAnalysis of the sprite sheet
+        row_bands: (start, end) row bands from sprite_grid.axis_cells(mask, 1)
+        row, column: Cell to isolate; columns come from the band's detected
+            grid pitch (cell 0 is the partial cell before the first gutter)
+        padding: Background pixels kept around the sprite, within the cell
     
-    return (left_x, top_y, right_x - left_x + 1, bottom_y - top_y + 1)
+    Returns: (x, y, width, height) of the isolated sprite, or None for an empty cell
+    """
+    y0, y1 = row_bands[row]
+    x0, x1 = axis_cells(analysis.mask[y0:y1], 0)[column]
+    
+    content = analysis.summed_area.content_bounds(x0, y0, x1 - x0, y1 - y0)
+    if content is None:
+        return None
+    min_x, min_y, max_x, max_y = content
+    top_y = max(y0, min_y - padding)
+    bottom_y = min(y1 - 1, max_y + padding)
+    left_x = max(x0, min_x - padding)
+    right_x = min(x1 - 1, max_x + padding)
+    
+    return (int(left_x), int(top_y), int(right_x - left_x + 1), int(bottom_y - top_y + 1))
 
 def identify_sprites_in_row(image_path, row_y, row_height, bg_color_hex='#ABD4E6'):
     """
     Identify individual sprites in a row by finding non-background regions.
     
     Args:
-        image_path: Path to the sprite sheet
+        image_path: Path to the sprite sheet (or an existing SheetAnalysis)
         row_y: Y coordinate of the row start
         row_height: Height of the row to search
         bg_color_hex: Background color to ignore
@@ -110,84 +82,44 @@ def identify_sprites_in_row(image_path, row_y, row_height, bg_color_hex='#ABD4E6
     Returns:
         List of sprite bounds (x, y, width, height) with actual sprite dimensions
     """
-    img = Image.open(image_path)
-    if img.mode != 'RGBA':
-        img = img.convert('RGBA')
-    
-    # Convert hex color to RGB
-    bg_color = tuple(int(bg_color_hex[i:i+2], 16) for i in (1, 3, 5))
+    # Pixels within 10 of the background color on every channel are background
+    analysis = image_path
+    if not isinstance(analysis, SheetAnalysis):
+        analysis = SheetAnalysis(image_path, bg_color_hex)
     
     # Search a larger area to find the actual sprites
-    search_start_y = row_y - 50  # Start searching 50px above expected position
-    search_end_y = row_y + row_height + 50  # End 50px below
+    search_start_y = max(0, row_y - 50)  # Start searching 50px above expected position
+    search_end_y = min(analysis.height, row_y + row_height + 50)  # End 50px below
     
-    # Get the search area
-    pixels = img.load()
-    
-    # Find columns with non-background pixels in the search area
-    non_bg_columns = []
-    for x in range(img.width):
-        has_content = False
-        for y in range(max(0, search_start_y), min(img.height, search_end_y)):
-            r, g, b, a = pixels[x, y]
-            # Check if pixel is NOT background (with tolerance)
-            if not (abs(r - bg_color[0]) < 10 and abs(g - bg_color[1]) < 10 and abs(b - bg_color[2]) < 10):
-                has_content = True
-                break
-        if has_content:
-            non_bg_columns.append(x)
-    
-    # Group consecutive columns into sprites
-    sprites = []
-    if non_bg_columns:
-        start_x = non_bg_columns[0]
-        prev_x = start_x
-        
-        for x in non_bg_columns[1:]:
-            if x - prev_x > 5:  # Gap detected, new sprite
-                # Find actual bounds of this sprite
-                bounds = find_sprite_bounds(img, start_x, prev_x + 1, 
-                                          max(0, search_start_y), 
-                                          min(img.height, search_end_y), 
-                                          bg_color)
-                sprites.append(bounds)
-                start_x = x
-            prev_x = x
-        
-        # Add the last sprite
-        bounds = find_sprite_bounds(img, start_x, prev_x + 1, 
-                                  max(0, search_start_y), 
-                                  min(img.height, search_end_y), 
-                                  bg_color)
-        sprites.append(bounds)
-    
-    return sprites
+    # Cut the band wherever more than 5 empty columns (or rows) separate content
+    band = analysis.mask[search_start_y:search_end_y]
+    return [(min_x, search_start_y + min_y, max_x - min_x + 1, max_y - min_y + 1)
+            for min_x, min_y, max_x, max_y in xy_cut(band, min_gap=5)]
 
-def extract_isolated_planes():
-    """Extract specific plane sprites with better isolation to avoid showing parts of other planes."""
+def extract_isolated_planes(decode_cache=None):
+    """
+    Extract specific plane sprites with better isolation to avoid showing parts of other planes.
+    Pass a directory as decode_cache to reuse cached decodes (see decode_cache).
+    """
     sprite_sheet = 'images/planes_spritesheet.gif'
     
-    # Open the sprite sheet
-    img = Image.open(sprite_sheet)
-    if img.mode != 'RGBA':
-        img = img.convert('RGBA')
+    # Decode and mask the sprite sheet once for every plane
+    analysis = open_analysis(sprite_sheet, decode_cache, background_color='#ABD4E6')
     
-    # Convert hex color to RGB
-    bg_color = tuple(int('#ABD4E6'[i:i+2], 16) for i in (1, 3, 5))
-    
-    # Define specific sprite locations (center X positions for sprites with thrust)
-    # These are the approximate center positions of the thrust sprites
+    # Rows are the sheet's bands of content; columns are cells of each band's
+    # detected grid pitch (row 0 is the title, column 0 the partial left cell)
+    row_bands = axis_cells(analysis.mask, 1)
     planes = [
-        # SU-33 (row 5) - keeping these as they are good
-        {'name': 'su33_1', 'row': 5, 'row_y': 728, 'center_x': 308, 'css_class': 'plane:nth-child(2)'},
-        {'name': 'su33_2', 'row': 5, 'row_y': 728, 'center_x': 424, 'css_class': 'plane:nth-child(5)'},
-        {'name': 'su33_3', 'row': 5, 'row_y': 728, 'center_x': 652, 'css_class': 'plane:nth-child(6)'},
+        # SU-33 (row 5)
+        {'name': 'su33_1', 'row': 5, 'column': 3, 'css_class': 'plane:nth-child(2)'},
+        {'name': 'su33_2', 'row': 5, 'column': 4, 'css_class': 'plane:nth-child(5)'},
+        {'name': 'su33_3', 'row': 5, 'column': 6, 'css_class': 'plane:nth-child(6)'},
         
-        # F-22 (row 3) - frame 4 with thrust
-        {'name': 'f22', 'row': 3, 'row_y': 456, 'center_x': 424, 'css_class': 'plane:nth-child(3)'},
+        # F-22 (row 3) - frame with thrust
+        {'name': 'f22', 'row': 3, 'column': 4, 'css_class': 'plane:nth-child(3)'},
         
-        # F-15 (row 4) - frame 5 with thrust  
-        {'name': 'f15', 'row': 4, 'row_y': 592, 'center_x': 542, 'css_class': 'plane:nth-child(4)'},
+        # F-15 (row 4) - frame with thrust
+        {'name': 'f15', 'row': 4, 'column': 5, 'css_class': 'plane:nth-child(4)'},
     ]
     
     # Create output directory
@@ -200,13 +132,16 @@ def extract_isolated_planes():
         print(f"\nExtracting {plane['name']}...")
         
         # Find isolated bounds for this specific sprite
-        bounds = find_single_sprite_bounds(img, plane['center_x'], plane['row_y'], bg_color)
+        bounds = find_cell_sprite_bounds(analysis, row_bands, plane['row'], plane['column'])
+        if bounds is None:
+            print(f"{plane['name']}: cell is empty, skipping")
+            continue
         x, y, width, height = bounds
         
         print(f"{plane['name']}: x={x}, y={y}, width={width}px, height={height}px")
         
         # Extract and save the sprite
-        sprite = extract_sprite(sprite_sheet, x, y, width, height)
+        sprite = analysis.cut(x, y, width, height, clear_color=False)
         output_path = f"isolated_sprites/{plane['name']}.png"
         sprite.save(output_path)
         print(f"Saved: {output_path}")
@@ -225,9 +160,9 @@ def extract_isolated_planes():
         f.write(css_output)
     print("\nSaved isolated CSS positions to isolated_sprite_positions.css")
 
-def extract_all_planes():
+def extract_all_planes(decode_cache=None):
     """Main extraction function - now extracts isolated sprites."""
-    extract_isolated_planes()
+    extract_isolated_planes(decode_cache)
 
 def create_preview_html():
     """Create an HTML file to preview the extracted sprites."""
@@ -236,6 +171,15 @@ def create_preview_html():
     # Find all extracted sprites
     sprite_files = sorted(glob.glob('extracted_sprites/su33_frame_*.png'))
     
+    # Play the frames from one strip instead of stacking an <img> per frame
+    animation_style = ""
+    if sprite_files:
+        strip, cell_width, cell_height = build_strip([Image.open(f) for f in sprite_files])
+        strip_file = 'extracted_sprites/su33_strip.png'
+        strip.save(strip_file)
+        animation_style = animation_css('su33-animation', strip_file, cell_width, cell_height,
+                                        len(sprite_files))
+    
     sprite_divs = ""
     for sprite_file in sprite_files:
         filename = os.path.basename(sprite_file)
@@ -274,22 +218,9 @@ def create_preview_html():
             height: 128px;
         }}
         .animation {{
-            position: relative;
-            width: 128px;
-            height: 128px;
             margin: 20px;
         }}
-        .animation img {{
-            position: absolute;
-            opacity: 0;
-            animation: fadeSequence {len(sprite_files) * 0.2}s infinite;
-        }}
-        @keyframes fadeSequence {{
-            0%, 100% {{ opacity: 0; }}
-            10% {{ opacity: 1; }}
-            20% {{ opacity: 0; }}
-        }}
-    </style>
+{animation_style}    </style>
 </head>
 <body>
     <h1>Extracted SU-33 Sprites from Row 5</h1>
@@ -301,15 +232,7 @@ def create_preview_html():
     </div>
     
     <h2>Animation Preview</h2>
-    <div class="animation">
-"""
-    
-    # Add animation frames with delays
-    for i, sprite_file in enumerate(sprite_files):
-        delay = i * 0.2
-        html += f'        <img src="{sprite_file}" style="animation-delay: {delay}s;">\n'
-    
-    html += """    </div>
+    <div class="animation su33-animation"></div>
 </body>
 </html>"""
     
@@ -318,8 +241,13 @@ def create_preview_html():
     print("Created sprite_preview.html")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extract isolated plane sprites")
+    parser.add_argument('--decode-cache', metavar='DIR',
+                        help="Memory-map decoded pixels, masks and labels cached in DIR (off by default)")
+    args = parser.parse_args()
+    
     print("Extracting plane sprites...")
-    extract_all_planes()
+    extract_all_planes(args.decode_cache)
     create_preview_html()
     print("\nDone! Check the 'extracted_sprites' folder for individual PNG files.")
     print("Open 'sprite_preview.html' to see the results.")
\ No newline at end of file
@@ -1,54 +1,340 @@
 #!/usr/bin/env python3
 """
 Generate cloud sprites for the game.
+The five classic clouds are drawn with ImageDraw; --count renders any number
+of seeded procedural clouds in one batched NumPy pass and packs them into a
+single sheet with a JSON manifest; --html renders every cloud <img> of a
+page at the exact size it is displayed.
 """
 
 from PIL import Image, ImageDraw
+import argparse
+import json
 import os
+import re
+import time
+import numpy as np
 
-def create_cloud_sprite(width, height, filename):
-    """Create a simple cloud sprite with transparency."""
+from asset_encoder import savings_report, write_asset
+from build_cache import write_if_changed
+from sprite_atlas import choose_atlas_layout
+from sprite_dedupe import exact_hash
+
+# The classic clouds, all drawn by draw_cloud at these native sizes
+CLASSIC_CLOUDS = [
+    (120, 60, 'cloud1.png'),
+    (150, 70, 'cloud2.png'),
+    (100, 50, 'cloud3.png'),
+    (130, 65, 'cloud4.png'),
+    (110, 55, 'cloud5.png'),
+]
+
+def create_cloud_sprite(width, height, filename, formats=('png',)):
+    """
+    Create a simple cloud sprite with transparency, written in the smallest
+    of formats (see asset_encoder.write_asset); returns the asset entry
+    """
+    return write_asset(draw_cloud(width, height), filename, formats)
+
+def draw_cloud(width, height):
+    """Draw the classic cloud shape at width x height"""
     # Create image with transparent background
     img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
     draw = ImageDraw.Draw(img)
-    
+
     # Cloud color (white with some transparency)
     cloud_color = (255, 255, 255, 200)
-    
+
     # Draw overlapping ellipses to create cloud shape
     # Main body
     draw.ellipse([width*0.2, height*0.3, width*0.8, height*0.7], fill=cloud_color)
-    
+
     # Left puff
     draw.ellipse([width*0.1, height*0.35, width*0.4, height*0.65], fill=cloud_color)
-    
+
     # Right puff
     draw.ellipse([width*0.6, height*0.35, width*0.9, height*0.65], fill=cloud_color)
-    
+
     # Top puff
     draw.ellipse([width*0.35, height*0.2, width*0.65, height*0.5], fill=cloud_color)
-    
+
     # Bottom puffs
     draw.ellipse([width*0.25, height*0.5, width*0.5, height*0.8], fill=cloud_color)
     draw.ellipse([width*0.5, height*0.5, width*0.75, height*0.8], fill=cloud_color)
-    
-    # Save the cloud sprite
-    img.save(filename)
-
-# Create cloud sprites directory
-os.makedirs('images/clouds', exist_ok=True)
-
-# Generate different sized cloud sprites
-clouds = [
-    (120, 60, 'images/clouds/cloud1.png'),
-    (150, 70, 'images/clouds/cloud2.png'),
-    (100, 50, 'images/clouds/cloud3.png'),
-    (130, 65, 'images/clouds/cloud4.png'),
-    (110, 55, 'images/clouds/cloud5.png'),
-]
 
-for width, height, filename in clouds:
-    create_cloud_sprite(width, height, filename)
-    print(f"Created {filename}")
+    return img
+
+def random_puffs(count, rng, cell_width=160, cell_height=80, min_puffs=4, max_puffs=9):
+    """
+    Pick the ellipses ("puffs") of count clouds.
+    Returns (puffs, active) where puffs is (count, max_puffs + 1, 4) of
+    center x, center y, radius x, radius y and active marks the puffs each
+    cloud actually uses; puff 0 is always the cloud's main body.
+    """
+    # Overall cloud size, roughly twice as wide as tall
+    width = rng.uniform(0.55, 0.95, count) * cell_width
+    height = np.minimum(width * rng.uniform(0.4, 0.55, count), cell_height * 0.95)
+    left = (cell_width - width) / 2
+    top = (cell_height - height) / 2
+
+    slots = max_puffs + 1
+    puffs = np.empty((count, slots, 4))
+    puffs[:, 0] = np.stack([left + width / 2, top + height * 0.55,
+                            width * 0.32, height * 0.24], axis=1)
+
+    # Puffs spread along the cloud, bigger in the middle and biased upward
+    along = rng.uniform(0.12, 0.88, (count, max_puffs))
+    size = rng.uniform(0.5, 1.0, (count, max_puffs)) * (1 - np.abs(along - 0.5))
+    puffs[:, 1:, 0] = left[:, None] + along * width[:, None]
+    puffs[:, 1:, 1] = top[:, None] + height[:, None] * rng.uniform(0.3, 0.6, (count, max_puffs))
+    puffs[:, 1:, 2] = width[:, None] * 0.28 * size
+    puffs[:, 1:, 3] = height[:, None] * 0.5 * size
+
+    puff_counts = rng.integers(min_puffs, max_puffs + 1, count)
+    active = np.arange(slots)[None, :] <= puff_counts[:, None]
+    return puffs, active
+
+def render_clouds(count, seed=0, cell_width=160, cell_height=80, max_puffs=9,
+                  falloff=0.35, opacity=200):
+    """
+    Render count seeded clouds in one batched array computation.
+
+    Every puff's coverage is 1 inside its ellipse and fades out smoothly
+    over the outer falloff share of its radius; a cloud's alpha is the union
+    of its puffs, and the underside is shaded slightly darker.
+    Returns a (count, cell_height, cell_width, 4) uint8 RGBA array.
+    """
+    rng = np.random.default_rng(seed)
+    puffs, active = random_puffs(count, rng, cell_width, cell_height, max_puffs=max_puffs)
+
+    # Unused puff slots are moved out of the cell so they cover nothing
+    puffs = puffs.astype(np.float32)
+    puffs[~active, 0] = -1e6
+    x = np.arange(cell_width, dtype=np.float32) + 0.5
+    y = np.arange(cell_height, dtype=np.float32)[:, None] + 0.5
+
+    # The ellipse distance is separable, so only the sum is full size;
+    # every full-size step works in place on two reused buffers
+    uncovered = np.ones((count, cell_height, cell_width), dtype=np.float32)
+    t = np.empty_like(uncovered)
+    step = np.empty_like(uncovered)
+    for slot in range(puffs.shape[1]):
+        cx, cy, rx, ry = (puffs[:, slot, i, None, None] for i in range(4))
+        np.add(((x - cx) / rx) ** 2, ((y - cy) / ry) ** 2, out=t)
+        np.sqrt(t, out=t)
+        np.subtract(1, t, out=t)
+        t *= 1 / falloff
+        np.clip(t, 0, 1, out=t)
+        # 1 - smoothstep(t) = 1 - t * t * (3 - 2t)
+        np.multiply(t, -2, out=step)
+        step += 3
+        step *= t
+        step *= t
+        np.subtract(1, step, out=step)
+        uncovered *= step
+    coverage = 1 - uncovered
+
+    # Soft grey-blue underside: darker the further below each cloud's middle
+    middle = puffs[:, 0, 1, None, None]
+    depth = puffs[:, 0, 3, None, None]
+    shade = np.clip((y - middle) / (2 * depth), 0, 1) * 0.12
+
+    pixels = np.empty((count, cell_height, cell_width, 4), dtype=np.uint8)
+    pixels[..., 0] = 255 * (1 - shade * 1.2)
+    pixels[..., 1] = 255 * (1 - shade)
+    pixels[..., 2] = 255 * (1 - shade * 0.6)
+    pixels[..., 3] = np.round(coverage * opacity)
+    return pixels
+
+def trim_cloud(pixels):
+    """Crop one rendered cloud to its visible pixels; returns (image, x, y)"""
+    visible = pixels[..., 3] > 0
+    rows = np.flatnonzero(visible.any(axis=1))
+    cols = np.flatnonzero(visible.any(axis=0))
+    if len(rows) == 0:
+        return Image.fromarray(pixels[:1, :1], 'RGBA'), 0, 0
+    crop = pixels[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    return Image.fromarray(crop, 'RGBA'), int(cols[0]), int(rows[0])
+
+def generate_cloud_sheet(count, seed=0, output_dir='images/clouds', name='clouds',
+                         max_size=2048, padding=1, formats=None, **render_options):
+    """
+    Render count seeded clouds and pack them into one sheet.
+
+    Writes <name>.png plus <name>.json, which lists each cloud's rect in
+    the sheet. Clouds are packed with the atlas skyline packer rather than
+    laid out in a single row, which keeps hundreds of clouds within
+    browser image size limits. With formats the sheet is written in its
+    smallest lossless encodings (see asset_encoder.write_asset) and the
+    manifest names the WebP, if one was kept, under 'webp'.
+    Returns the manifest dict
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    pixels = render_clouds(count, seed, **render_options)
+    render_time = time.perf_counter() - start
+
+    clouds = [trim_cloud(cloud) for cloud in pixels]
+    sizes = [(img.width + padding, img.height + padding) for img, _, _ in clouds]
+    placements, extents = choose_atlas_layout(sizes, max_size + padding)
+    if len(extents) > 1:
+        raise ValueError(f"{count} clouds do not fit in one {max_size}x{max_size} sheet")
+
+    width, height = extents[0]
+    sheet = Image.new('RGBA', (width - padding, height - padding), (0, 0, 0, 0))
+    entries = []
+    for i, ((img, _, _), (_, x, y)) in enumerate(zip(clouds, placements)):
+        sheet.paste(img, (x, y))
+        entries.append({'id': i, 'x': x, 'y': y, 'width': img.width, 'height': img.height})
+
+    manifest = {
+        'image': f"{name}.png",
+        'width': sheet.width,
+        'height': sheet.height,
+        'seed': seed,
+        'count': count,
+        'clouds': entries,
+    }
+
+    image_path = os.path.join(output_dir, f"{name}.png")
+    entry = write_asset(sheet, image_path, formats or ('png',))
+    if 'webp' in entry['files']:
+        manifest['webp'] = entry['files']['webp']
+    savings_report({name: entry})
+    write_if_changed(os.path.join(output_dir, f"{name}.json"),
+                     json.dumps(manifest, indent=2).encode())
+
+    print(f"Rendered {count} clouds in {render_time * 1000:.0f}ms, "
+          f"packed into {image_path} ({sheet.width}x{sheet.height})")
+    return manifest
+
+CLOUD_IMG = re.compile(r'<img\b[^>]*\bclass="[^"]*\bcloud\b[^"]*"[^>]*>')
+
+def scan_cloud_tags(html):
+    """
+    Find the cloud <img> tags of a page.
+    Returns one (tag, src, width, height) per tag, with the size taken from
+    the inline style (None when a dimension is not set in px).
+    """
+    tags = []
+    for match in CLOUD_IMG.finditer(html):
+        tag = match.group(0)
+        src = re.search(r'\bsrc="([^"]*)"', tag)
+        style = re.search(r'\bstyle="([^"]*)"', tag)
+        style = style.group(1) if style else ''
+        width = re.search(r'(?:^|;)\s*width:\s*(\d+)px', style)
+        height = re.search(r'(?:^|;)\s*height:\s*(\d+)px', style)
+        tags.append((tag, src.group(1) if src else None,
+                     int(width.group(1)) if width else None,
+                     int(height.group(1)) if height else None))
+    return tags
+
+def render_variant(source_path, width, height):
+    """
+    A cloud image at exactly width x height: the source itself at its own
+    size, the classic shape redrawn for classic clouds, otherwise a
+    high-quality resample done once at build time
+    """
+    source = Image.open(source_path).convert('RGBA')
+    if source.size == (width, height):
+        return source
+    if os.path.basename(source_path) in {filename for _, _, filename in CLASSIC_CLOUDS}:
+        return draw_cloud(width, height)
+    return source.resize((width, height), Image.LANCZOS)
+
+def generate_display_variants(html_path, update_html=True, formats=('png',)):
+    """
+    Render every distinct (source, width, height) of the page's cloud tags
+    at its display size and point the tags at the results.
+
+    A variant whose pixels match a cloud that already exists (another
+    source, or a variant rendered earlier) reuses that file, so each
+    distinct bitmap is written and downloaded once. Variants are written
+    in the smallest of formats (see asset_encoder.write_asset).
+    Returns the {(src, width, height): new src} mapping.
+    """
+    with open(html_path) as f:
+        html = f.read()
+    base_dir = os.path.dirname(os.path.abspath(html_path))
+    tags = scan_cloud_tags(html)
+
+    # Existing sources, keyed by their pixels
+    by_content = {}
+    for _, src, _, _ in tags:
+        if src and src not in by_content.values():
+            source = Image.open(os.path.join(base_dir, src)).convert('RGBA')
+            by_content.setdefault(exact_hash(source), src)
+
+    variants = {}
+    entries = {}
+    for _, src, width, height in tags:
+        key = (src, width, height)
+        if key in variants or not src or width is None or height is None:
+            continue
+
+        image = render_variant(os.path.join(base_dir, src), width, height)
+        content = exact_hash(image)
+        if content not in by_content:
+            stem, ext = os.path.splitext(src)
+            variant_src = f"{stem}_{width}x{height}{ext}"
+            entries[variant_src] = write_asset(image, os.path.join(base_dir, variant_src), formats)
+            by_content[content] = variant_src
+            print(f"Rendered {variant_src}")
+        variants[key] = by_content[content]
+
+    # Point every tag at the bitmap that matches its display size
+    rewritten = 0
+    for tag, src, width, height in tags:
+        new_src = variants.get((src, width, height), src)
+        if new_src != src:
+            html = html.replace(tag, tag.replace(f'src="{src}"', f'src="{new_src}"'), 1)
+            rewritten += 1
+
+    if update_html and write_if_changed(html_path, html.encode()):
+        print(f"Updated {rewritten} cloud tags in {html_path}")
+
+    print(f"{len(tags)} cloud tags use {len(variants)} distinct (source, size) pairs: "
+          f"{len(entries)} variants rendered, {len(set(variants.values()))} bitmaps in total")
+    savings_report(entries)
+    return variants
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate cloud sprites")
+    parser.add_argument('--count', type=int, default=0,
+                        help="Also render this many procedural clouds into one packed sheet")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default='images/clouds')
+    parser.add_argument('--name', default='clouds', help="Base name of the sheet and manifest")
+    parser.add_argument('--formats', nargs='+', choices=['png', 'png8', 'webp'],
+                        help="Write the clouds in the smallest of these lossless encodings "
+                             "(default: optimized PNG)")
+    parser.add_argument('--html', metavar='PAGE',
+                        help="Render the page's cloud <img> tags at their display sizes "
+                             "and point the tags at the variants")
+    args = parser.parse_args()
+
+    # Create cloud sprites directory
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    formats = args.formats or ('png',)
+
+    # Generate different sized cloud sprites
+    entries = {}
+    for width, height, filename in CLASSIC_CLOUDS:
+        entries[filename] = create_cloud_sprite(width, height,
+                                                os.path.join(args.output_dir, filename), formats)
+        print(f"Created {os.path.join(args.output_dir, filename)}")
+    savings_report(entries)
+
+    if args.count:
+        generate_cloud_sheet(args.count, args.seed, args.output_dir, args.name,
+                             formats=formats)
+
+    if args.html:
+        generate_display_variants(args.html, formats=formats)
+
+    print("Cloud sprites generated!")
 
-print("Cloud sprites generated!")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
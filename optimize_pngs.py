@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Optimize PNGs - Lossless recompression pass over generated images
+Every PNG is re-encoded at the smallest color type and bit depth that holds
+its pixels exactly (palette, grayscale, RGB or RGBA), with no ancillary
+chunks beyond tRNS. Each PNG row filter and several zlib strategies are
+tried, and a file is only replaced when the result is smaller and decodes
+to identical pixels.
+Usage: python optimize_pngs.py [dirs or files ...] (default: sprites images/clouds)
+"""
+
+from PIL import Image
+import argparse
+import io
+import os
+import struct
+import zlib
+import numpy as np
+
+from build_cache import hash_bytes, load_manifest, save_manifest, write_if_changed
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# zlib strategies worth trying on filtered scanlines
+STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED, zlib.Z_RLE)
+
+def png_chunk(kind, data):
+    """One PNG chunk: length, type, data and CRC"""
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def color_layouts(rgba):
+    """
+    Every lossless way to store an RGBA pixel array.
+    Yields (color_type, bit_depth, samples, plte, trns) where samples is the
+    (height, row_bytes) uint8 array of packed scanlines.
+    """
+    height, width = rgba.shape[:2]
+    opaque = bool((rgba[..., 3] == 255).all())
+    gray = bool(((rgba[..., 0] == rgba[..., 1]) & (rgba[..., 1] == rgba[..., 2])).all())
+
+    # Palette, with translucent entries first so tRNS stays short
+    packed = rgba.reshape(-1, 4).view(np.uint32).ravel()
+    colors, indices = np.unique(packed, return_inverse=True)
+    if len(colors) <= 256:
+        palette = colors.view(np.uint8).reshape(-1, 4)
+        order = np.argsort(palette[:, 3] == 255, kind='stable')
+        palette = palette[order]
+        indices = np.argsort(order)[indices].astype(np.uint8).reshape(height, width)
+
+        depth = next(d for d in (1, 2, 4, 8) if len(palette) <= 1 << d)
+        translucent = int((palette[:, 3] < 255).sum())
+        trns = palette[:translucent, 3].tobytes() if translucent else None
+        yield 3, depth, pack_bits(indices, depth), palette[:, :3].tobytes(), trns
+
+    if gray and opaque:
+        yield 0, 8, rgba[..., 0].copy(), None, None
+    if gray:
+        yield 4, 8, rgba[..., [0, 3]].reshape(height, -1), None, None
+    if opaque:
+        yield 2, 8, rgba[..., :3].reshape(height, -1), None, None
+    yield 6, 8, rgba.reshape(height, -1), None, None
+
+def pack_bits(indices, depth):
+    """Pack palette indices into scanlines of depth-bit samples"""
+    if depth == 8:
+        return indices
+    height, width = indices.shape
+    per_byte = 8 // depth
+    padded = np.zeros((height, -(-width // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :width] = indices
+    groups = padded.reshape(height, -1, per_byte)
+    shifts = np.arange(per_byte - 1, -1, -1, dtype=np.uint8) * depth
+    return (groups << shifts).sum(axis=2, dtype=np.uint16).astype(np.uint8)
+
+def filter_rows(samples, bpp):
+    """
+    All five PNG filters applied to every row at once.
+    Returns a (5, height, row_bytes) uint8 array indexed by filter type.
+    """
+    raw = samples.astype(np.int16)
+    left = np.zeros_like(raw)
+    left[:, bpp:] = raw[:, :-bpp]
+    up = np.zeros_like(raw)
+    up[1:] = raw[:-1]
+    up_left = np.zeros_like(raw)
+    up_left[1:, bpp:] = raw[:-1, :-bpp]
+
+    # Paeth predictor
+    p = left + up - up_left
+    pa, pb, pc = np.abs(p - left), np.abs(p - up), np.abs(p - up_left)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+
+    predictions = [0, left, up, (left + up) // 2, paeth]
+    return np.stack([(raw - prediction) % 256 for prediction in predictions]).astype(np.uint8)
+
+def filtered_streams(samples, bpp):
+    """
+    Candidate IDAT payloads: each filter used on every row, plus a per-row
+    choice by the minimum sum of absolute differences heuristic
+    """
+    filtered = filter_rows(samples, bpp)
+    height = samples.shape[0]
+    filter_bytes = np.arange(5, dtype=np.uint8)
+
+    for f in range(5):
+        yield np.column_stack([np.full(height, f, dtype=np.uint8), filtered[f]]).tobytes()
+
+    # Bytes as signed values; pick the filter with the smallest total per row
+    cost = np.abs(filtered.astype(np.int8).astype(np.int16)).sum(axis=2)
+    best = cost.argmin(axis=0)
+    rows = filtered[best, np.arange(height)]
+    yield np.column_stack([filter_bytes[best], rows]).tobytes()
+
+def encode_layout(width, height, layout):
+    """Smallest PNG for one color layout over every filter and zlib strategy"""
+    color_type, depth, samples, plte, trns = layout
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    bpp = max(1, channels * depth // 8)
+
+    best = None
+    for stream in filtered_streams(samples, bpp):
+        for strategy in STRATEGIES:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+            data = compressor.compress(stream) + compressor.flush()
+            if best is None or len(data) < len(best):
+                best = data
+
+    png = PNG_SIGNATURE
+    png += png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, depth, color_type, 0, 0, 0))
+    if plte is not None:
+        png += png_chunk(b'PLTE', plte)
+    if trns is not None:
+        png += png_chunk(b'tRNS', trns)
+    png += png_chunk(b'IDAT', best)
+    png += png_chunk(b'IEND', b'')
+    return png
+
+def decode_rgba(data):
+    """Decode PNG bytes to an RGBA array"""
+    return np.asarray(Image.open(io.BytesIO(data)).convert('RGBA'))
+
+def optimize_png(data):
+    """
+    Smallest pixel-identical re-encoding of PNG bytes, or the original
+    bytes when nothing beats them
+    """
+    rgba = decode_rgba(data)
+    height, width = rgba.shape[:2]
+
+    best = data
+    for layout in color_layouts(rgba):
+        candidate = encode_layout(width, height, layout)
+        if len(candidate) < len(best) and np.array_equal(decode_rgba(candidate), rgba):
+            best = candidate
+    return best
+
+def find_pngs(paths):
+    """Expand files and directories into a sorted list of PNG paths"""
+    pngs = []
+    for path in paths:
+        if os.path.isdir(path):
+            pngs.extend(os.path.join(path, entry) for entry in os.listdir(path)
+                        if entry.lower().endswith('.png'))
+        elif path.lower().endswith('.png'):
+            pngs.append(path)
+    return sorted(pngs)
+
+def refresh_build_manifests(changed):
+    """
+    Record the new contents of rewritten files in their directory's build
+    manifest, so the next extract_sprites run still sees its outputs as current
+    """
+    by_dir = {}
+    for path, digest in changed.items():
+        by_dir.setdefault(os.path.dirname(path), {})[os.path.basename(path)] = digest
+
+    for output_dir, digests in by_dir.items():
+        manifest = load_manifest(output_dir)
+        if not manifest:
+            continue
+        for entry in manifest.values():
+            outputs = entry.get('outputs', {}) if isinstance(entry, dict) else {}
+            for filename in outputs.keys() & digests.keys():
+                outputs[filename] = digests[filename]
+        save_manifest(output_dir, manifest)
+
+def optimize_pngs(paths, dry_run=False):
+    """
+    Losslessly shrink every PNG under paths and print a before/after report.
+    Returns (bytes_before, bytes_after)
+    """
+    total_before = 0
+    total_after = 0
+    changed = {}
+    for path in find_pngs(paths):
+        with open(path, 'rb') as f:
+            data = f.read()
+        optimized = optimize_png(data)
+        total_before += len(data)
+        total_after += len(optimized)
+
+        if optimized is data:
+            print(f"  {path}: {len(data)} bytes (already optimal)")
+            continue
+
+        print(f"  {path}: {len(data)} -> {len(optimized)} bytes "
+              f"({1 - len(optimized) / len(data):.1%} smaller)")
+        if not dry_run:
+            write_if_changed(path, optimized)
+            changed[path] = hash_bytes(optimized)
+
+    refresh_build_manifests(changed)
+
+    if total_before:
+        print(f"Total: {total_before} -> {total_after} bytes "
+              f"({total_before - total_after} bytes, {1 - total_after / total_before:.1%} saved)"
+              f"{' [dry run]' if dry_run else ''}")
+    return total_before, total_after
+
+def main():
+    parser = argparse.ArgumentParser(description="Losslessly recompress generated PNGs")
+    parser.add_argument('paths', nargs='*', default=['sprites', 'images/clouds'],
+                        help="PNG files or directories (default: sprites images/clouds)")
+    parser.add_argument('--dry-run', action='store_true', help="Report savings without rewriting files")
+    args = parser.parse_args()
+
+    optimize_pngs(args.paths, args.dry_run)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Pipeline Stats - Opt-in stage timing and counters for extraction runs
+Records wall and CPU time per stage plus counters such as pixels scanned,
+components found and bytes written, and can attach cProfile to one stage.
+"""
+
+from contextlib import contextmanager
+import atexit
+import cProfile
+import json
+import pstats
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, if the OS reports it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+class PipelineStats:
+    """
+    Collects per-stage timings and counters for one run.
+
+    A disabled instance (the default for every pipeline entry point)
+    records nothing, so instrumentation costs nothing unless asked for.
+
+    Args:
+        enabled: Record anything at all
+        profile_stage: Name of a stage to run under cProfile; every call
+            of the stage adds to one profile, saved once by write() or at exit
+        profile_path: Where to dump that profile (pstats format);
+            when None the top functions are printed instead
+    """
+
+    def __init__(self, enabled=True, profile_stage=None, profile_path=None):
+        self.enabled = enabled
+        self.profile_stage = profile_stage
+        self.profile_path = profile_path
+        self.stages = {}
+        self.counters = {}
+        self._start = time.perf_counter()
+        self._profiler = None
+        self._profile_saved = False
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block of work under a stage name (repeat calls accumulate)"""
+        if not self.enabled:
+            yield
+            return
+
+        profiling = name == self.profile_stage
+        if profiling:
+            if self._profiler is None:
+                self._profiler = cProfile.Profile()
+                atexit.register(self.save_profile)
+            self._profiler.enable()
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            if profiling:
+                self._profiler.disable()
+
+            entry = self.stages.setdefault(name, {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0})
+            entry['wall_s'] += wall
+            entry['cpu_s'] += cpu
+            entry['calls'] += 1
+
+    def count(self, name, amount=1):
+        """Add to a named counter"""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + int(amount)
+
+    def save_profile(self):
+        """Dump or print the profile of every call of the profiled stage (only once)"""
+        if self._profiler is None or self._profile_saved:
+            return
+        self._profile_saved = True
+        name = self.profile_stage
+        calls = self.stages.get(name, {}).get('calls', 0)
+        if self.profile_path:
+            self._profiler.dump_stats(self.profile_path)
+            print(f"Profile of stage '{name}' ({calls} calls) written to {self.profile_path}")
+        else:
+            print(f"\nProfile of stage '{name}' ({calls} calls):")
+            pstats.Stats(self._profiler).sort_stats('cumulative').print_stats(20)
+
+    def report(self):
+        """Everything recorded so far as a JSON-friendly dict"""
+        return {
+            'total_wall_s': round(time.perf_counter() - self._start, 4),
+            'stages': {name: {key: round(value, 4) if isinstance(value, float) else value
+                              for key, value in entry.items()}
+                       for name, entry in self.stages.items()},
+            'counters': dict(self.counters),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    def write(self, path):
+        """Write the report as JSON (and save the stage profile, if any)"""
+        self.save_profile()
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"Stage stats written to {path}")
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Sheet Analysis - Decode a sprite sheet once and share everything derived from it
+The background color, foreground mask, component labels and keyed RGBA
+pixels are computed lazily and cached, so every extractor in a run reuses
+one decode and one labeling.
+"""
+
+from PIL import Image
+import numpy as np
+from collections import Counter
+
+from build_cache import hash_bytes, hash_file
+from sprite_labeling import foreground_mask, label_components, label_image
+from summed_area import SummedAreaTable
+
+def detect_background_color(image, mode='histogram', stride=32):
+    """
+    Detect the background color and how confident we are in it.
+    Returns (color, confidence) where confidence is the share of the
+    inspected pixels that have exactly that color.
+    image may be a PIL image or an RGB/RGBA pixel array.
+    """
+    if isinstance(image, np.ndarray):
+        pixels = image[..., :3]
+    else:
+        # Convert to RGB if needed
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        pixels = np.asarray(image)
+
+    if mode == 'counter':
+        # Count occurrences of each color
+        color_counts = Counter(map(tuple, pixels.reshape(-1, 3).tolist()))
+
+        # Return the most common color
+        background_color, count = color_counts.most_common(1)[0]
+        return background_color, count / (pixels.shape[0] * pixels.shape[1])
+
+    if mode == 'border':
+        pixels = sample_gutter_pixels(pixels, stride)
+    elif mode != 'histogram':
+        raise ValueError(f"Unknown background detection mode: {mode}")
+
+    # Pack RGB into one uint32 per pixel and histogram the packed values
+    colors, counts = np.unique(pack_rgb(pixels), return_counts=True)
+    return most_common_color(colors, counts)
+
+def pack_rgb(pixels):
+    """Pack the RGB channels of a pixel array into one uint32 per pixel"""
+    pixels = pixels[..., :3].reshape(-1, 3).astype(np.uint32)
+    return (pixels[:, 0] << 16) | (pixels[:, 1] << 8) | pixels[:, 2]
+
+def most_common_color(colors, counts):
+    """
+    Pick the most frequent color from a histogram of packed RGB values.
+    Returns (color, share of all counted pixels)
+    """
+    best = counts.argmax()
+    value = int(colors[best])
+    background_color = ((value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF)
+    return background_color, float(counts[best] / counts.sum())
+
+def sample_gutter_pixels(pixels, stride=32):
+    """
+    Sample the sheet edges plus every stride-th row and column.
+    Sprite sheets leave gutters of background between frames, so these
+    lines are dominated by the background color.
+    """
+    height, width = pixels.shape[:2]
+    rows = np.unique(np.r_[0:height:stride, height - 1])
+    cols = np.unique(np.r_[0:width:stride, width - 1])
+    channels = pixels.shape[2]
+    return np.concatenate([
+        pixels[rows].reshape(-1, channels),
+        pixels[:, cols].reshape(-1, channels),
+    ])
+
+def detect_palette_background(indices, palette, mode='histogram', stride=32):
+    """
+    Background detection for indexed images: histogram the palette indices
+    (256 bins), then merge indices that share a color.
+    Returns (color, confidence) like detect_background_color.
+    """
+    if mode == 'border':
+        indices = sample_gutter_pixels(indices[..., np.newaxis], stride)
+    elif mode not in ('histogram', 'counter'):
+        raise ValueError(f"Unknown background detection mode: {mode}")
+
+    index_counts = np.bincount(indices.ravel(), minlength=len(palette))
+    return palette_background_from_counts(index_counts, palette)
+
+def palette_background_from_counts(index_counts, palette):
+    """Background (color, confidence) from a histogram of palette indices"""
+    colors, color_of_index = np.unique(pack_rgb(palette), return_inverse=True)
+    color_counts = np.bincount(color_of_index, weights=index_counts[:len(palette)])
+    color, _ = most_common_color(colors, color_counts)
+    return color, float(color_counts.max() / index_counts.sum())
+
+def key_pixels(pixels, mask, clear_color=True):
+    """
+    Copy of an RGBA pixel array with every pixel outside mask made
+    transparent; with clear_color their RGB is zeroed as well
+    """
+    keyed = pixels.copy()
+    background = ~mask
+    if clear_color:
+        keyed[background] = 0
+    else:
+        keyed[background, 3] = 0
+    return keyed
+
+def parse_hex_color(color):
+    """Convert '#RRGGBB' to an (r, g, b) tuple; tuples pass through"""
+    if isinstance(color, str):
+        return tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
+    return tuple(color[:3])
+
+class SheetAnalysis:
+    """
+    One decoded sprite sheet plus everything derived from it.
+
+    Args:
+        image: Path to the sprite sheet or an already opened PIL image
+        background_color: (r, g, b) or '#RRGGBB'; detected when None
+        tolerance: Max per-channel difference still counted as background
+        connectivity: 4 or 8 neighbour connectivity for labeling
+        background_mode: Detection mode used when background_color is None
+        palette: Stay in palette space for indexed (P mode) sheets. The
+            mask then comes from a per-palette-entry lookup table over a
+            uint8 index array and sprites are cut as indexed images.
+    """
+
+    # Whole-sheet arrays are held in memory (see sheet_strips.StripAnalysis)
+    streaming = False
+
+    def __init__(self, image, background_color=None, tolerance=10,
+                 connectivity=8, background_mode='histogram', palette=False):
+        self.path = None
+        if isinstance(image, str):
+            self.path = image
+            image = Image.open(image)
+        self.width, self.height = image.size
+
+        self.indices = None
+        self.palette = None
+        self._pixels = None
+        if palette and image.mode == 'P':
+            # One byte per pixel; RGBA is only decoded if something asks for it
+            self.image = image
+            self.indices = np.array(image)
+            self.palette = np.array(image.getpalette(), dtype=np.uint8).reshape(-1, 3)
+        else:
+            # Decode once; RGBA keeps any transparency the source already has
+            if image.mode != 'RGBA':
+                image = image.convert('RGBA')
+            self.image = image
+            self._pixels = np.array(image)
+
+        self._init_state(background_color, tolerance, connectivity, background_mode)
+
+    def _init_state(self, background_color, tolerance, connectivity, background_mode):
+        """
+        Detection parameters and the empty lazy caches; subclasses that
+        load the sheet their own way call this instead of __init__
+        """
+        self.tolerance = tolerance
+        self.connectivity = connectivity
+        self.background_mode = background_mode
+        self.background_confidence = None
+        self._background_color = None
+        if background_color is not None:
+            self._background_color = parse_hex_color(background_color)
+
+        self._mask = None
+        self._components = None
+        self._labels = None
+        self._summed_area = None
+        self._keyed = {}
+
+    @property
+    def indexed(self):
+        """True when working in palette space"""
+        return self.indices is not None
+
+    @property
+    def pixels(self):
+        """RGBA pixel array (decoded on first use in palette mode)"""
+        if self._pixels is None:
+            self._pixels = np.array(self.image.convert('RGBA'))
+        return self._pixels
+
+    @property
+    def background_color(self):
+        """Background (r, g, b), detected on first use"""
+        if self._background_color is None:
+            if self.indexed:
+                self._background_color, self.background_confidence = \
+                    detect_palette_background(self.indices, self.palette, self.background_mode)
+            else:
+                self._background_color, self.background_confidence = \
+                    detect_background_color(self.pixels, self.background_mode)
+        return self._background_color
+
+    @property
+    def foreground_entries(self):
+        """
+        Lookup table over all 256 palette indices, True for sprite colors.
+        The GIF transparency index, if any, counts as background.
+        """
+        lut = np.zeros(256, dtype=bool)
+        lut[:len(self.palette)] = foreground_mask(self.palette[np.newaxis], self.background_color,
+                                                  self.tolerance)[0]
+        transparency = self.image.info.get('transparency')
+        if isinstance(transparency, int):
+            lut[transparency] = False
+        return lut
+
+    @property
+    def mask(self):
+        """Boolean foreground mask (True for sprite pixels)"""
+        if self._mask is None:
+            if self.indexed:
+                self._mask = self.foreground_entries[self.indices]
+            else:
+                self._mask = foreground_mask(self.pixels, self.background_color, self.tolerance)
+        return self._mask
+
+    @property
+    def components(self):
+        """Connected components of the mask, see sprite_labeling.label_components"""
+        if self._components is None:
+            self._components = label_components(self.mask, self.connectivity)
+        return self._components
+
+    @property
+    def summed_area(self):
+        """SummedAreaTable of the mask, for content bounds without pixel scans"""
+        if self._summed_area is None:
+            self._summed_area = SummedAreaTable(self.mask)
+        return self._summed_area
+
+    @property
+    def labels(self):
+        """Label image with background 0 and components numbered from 1"""
+        if self._labels is None:
+            self._labels = label_image(self.mask.shape, self.components)
+        return self._labels
+
+    def content_hash(self):
+        """Hash identifying the sheet's contents, for build caching"""
+        if self.path:
+            return hash_file(self.path)
+        return hash_bytes((self.indices if self.indexed else self.pixels).tobytes())
+
+    def sprite_bounds(self, min_size=10):
+        """
+        Bounding boxes (min_x, min_y, max_x, max_y) of every component wider
+        and taller than min_size, in raster order of their first pixel
+        """
+        sprites = []
+        for min_x, min_y, max_x, max_y in self.components['bounds'].tolist():
+            if max_x - min_x + 1 > min_size and max_y - min_y + 1 > min_size:
+                sprites.append((min_x, min_y, max_x, max_y))
+        return sprites
+
+    def keyed(self, clear_color=True):
+        """
+        RGBA pixels with the background made transparent.
+        With clear_color the background RGB is zeroed too, otherwise only
+        the alpha channel changes.
+        """
+        if clear_color not in self._keyed:
+            self._keyed[clear_color] = key_pixels(self.pixels, self.mask, clear_color)
+        return self._keyed[clear_color]
+
+    def cut(self, x, y, width, height, clear_color=True):
+        """
+        Cut a keyed sprite out of the sheet as an RGBA image, or in palette
+        mode as an indexed image whose background entries are transparent
+        """
+        if self.indexed:
+            return self.cut_indexed(x, y, width, height)
+        keyed = self.keyed(clear_color)
+        return Image.fromarray(keyed[y:y + height, x:x + width], 'RGBA')
+
+    def cut_indexed(self, x, y, width, height):
+        """Cut a sprite as a P mode image that shares the sheet's palette"""
+        return self.indexed_sprite(self.indices[y:y + height, x:x + width])
+
+    def indexed_sprite(self, indices):
+        """P mode image of some palette indices with this sheet's palette and tRNS"""
+        sprite = Image.fromarray(indices, 'P')
+        sprite.putpalette(self.palette.tobytes())
+
+        # tRNS: opaque sprite colors, fully transparent background entries
+        alpha = np.where(self.foreground_entries[:len(self.palette)], 255, 0).astype(np.uint8)
+        sprite.info['transparency'] = alpha.tobytes()
+        return sprite
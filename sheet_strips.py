@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Sheet Strips - Bounded-memory analysis of very large sprite sheets
+The sheet is read in horizontal strips, either from a PIL image or from a
+memory-mapped .npy pixel array, and each strip is masked and labeled on its
+own. Components crossing strip seams are merged afterwards, so the working
+set depends on the strip size rather than on the sheet size.
+"""
+
+from PIL import Image
+import hashlib
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from build_cache import hash_file
+from sheet_analysis import (SheetAnalysis, key_pixels, most_common_color, pack_rgb,
+                            palette_background_from_counts)
+from sprite_labeling import foreground_mask, label_strips
+
+def open_sheet_source(image):
+    """
+    Open a sprite sheet without decoding it: .npy files are memory-mapped,
+    other paths are opened lazily with PIL; images and arrays pass through
+    """
+    if isinstance(image, str):
+        if image.lower().endswith('.npy'):
+            return np.load(image, mmap_mode='r')
+        return Image.open(image)
+    return image
+
+def save_sheet_npy(image_path, npy_path, strip_height=1024):
+    """
+    Decode a sprite sheet once into an RGBA .npy file that StripAnalysis
+    can memory-map, writing it strip by strip
+    """
+    image = Image.open(image_path)
+    width, height = image.size
+    pixels = open_memmap(npy_path, mode='w+', dtype=np.uint8, shape=(height, width, 4))
+    for y0 in range(0, height, strip_height):
+        y1 = min(height, y0 + strip_height)
+        pixels[y0:y1] = np.asarray(image.crop((0, y0, width, y1)).convert('RGBA'))
+    pixels.flush()
+    return npy_path
+
+class StripAnalysis(SheetAnalysis):
+    """
+    A SheetAnalysis that never holds the whole sheet's pixels or mask.
+
+    Background detection and labeling each make one pass over the sheet in
+    strips of strip_height rows; sprites are cut and keyed one region at a
+    time. A PIL source is still decoded by PIL in its own mode (one byte per
+    pixel for indexed sheets); a memory-mapped .npy source (see
+    save_sheet_npy) is only paged in a strip at a time.
+
+    Args are as for SheetAnalysis, plus:
+        strip_height: Rows read, masked and labeled at once
+    """
+
+    streaming = True
+
+    def __init__(self, image, background_color=None, tolerance=10, connectivity=8,
+                 background_mode='histogram', palette=False, strip_height=256):
+        self.path = image if isinstance(image, str) else None
+        self.source = open_sheet_source(image)
+        if isinstance(self.source, np.ndarray):
+            self.height, self.width = self.source.shape[:2]
+            self.image = None
+        else:
+            self.width, self.height = self.source.size
+            self.image = self.source
+
+        self.palette = None
+        if palette and self.image is not None and self.image.mode == 'P':
+            self.palette = np.array(self.image.getpalette(), dtype=np.uint8).reshape(-1, 3)
+
+        self.strip_height = max(1, strip_height)
+        self._init_state(background_color, tolerance, connectivity, background_mode)
+        self._lut = None
+
+    @property
+    def indexed(self):
+        """True when working in palette space"""
+        return self.palette is not None
+
+    def read(self, x, y, width, height):
+        """
+        Pixels of one region: palette indices in palette mode, otherwise RGBA
+        """
+        if self.image is None:
+            region = np.asarray(self.source[y:y + height, x:x + width])
+            if region.shape[2] == 3:
+                alpha = np.full(region.shape[:2] + (1,), 255, dtype=np.uint8)
+                region = np.concatenate([region, alpha], axis=2)
+            return region
+
+        region = self.image.crop((x, y, x + width, y + height))
+        if self.indexed:
+            return np.array(region)
+        return np.array(region.convert('RGBA'))
+
+    def strips(self):
+        """Yield (y0, pixels) for each strip from the top of the sheet down"""
+        for y0 in range(0, self.height, self.strip_height):
+            yield y0, self.read(0, y0, self.width, min(self.strip_height, self.height - y0))
+
+    def strip_mask(self, pixels):
+        """Foreground mask of one strip or region"""
+        if self.indexed:
+            if self._lut is None:
+                self._lut = self.foreground_entries
+            return self._lut[pixels]
+        return foreground_mask(pixels, self.background_color, self.tolerance)
+
+    @property
+    def background_color(self):
+        """Background (r, g, b), detected on first use with one pass over the strips"""
+        if self._background_color is None:
+            if self.background_mode not in ('histogram', 'border', 'counter'):
+                raise ValueError(f"Unknown background detection mode: {self.background_mode}")
+            if self.indexed:
+                self._detect_palette_background()
+            else:
+                self._detect_rgb_background()
+        return self._background_color
+
+    def _samples(self, y0, pixels):
+        """The pixels of a strip that background detection looks at"""
+        if self.background_mode != 'border':
+            return pixels.reshape(-1, pixels.shape[-1]) if pixels.ndim == 3 else pixels.ravel()
+
+        # Same gutter lines as sample_gutter_pixels, taken strip by strip
+        stride = 32
+        ys = np.arange(y0, y0 + len(pixels))
+        rows = np.nonzero((ys % stride == 0) | (ys == self.height - 1))[0]
+        cols = np.unique(np.r_[0:self.width:stride, self.width - 1])
+        if pixels.ndim == 2:
+            return np.concatenate([pixels[rows].ravel(), pixels[:, cols].ravel()])
+        channels = pixels.shape[2]
+        return np.concatenate([pixels[rows].reshape(-1, channels),
+                               pixels[:, cols].reshape(-1, channels)])
+
+    def _detect_rgb_background(self):
+        """Merge per-strip packed color histograms"""
+        colors = np.zeros(0, dtype=np.uint32)
+        counts = np.zeros(0, dtype=np.int64)
+        for y0, pixels in self.strips():
+            strip_colors, strip_counts = np.unique(pack_rgb(self._samples(y0, pixels)),
+                                                   return_counts=True)
+            colors, inverse = np.unique(np.r_[colors, strip_colors], return_inverse=True)
+            counts = np.bincount(inverse, weights=np.r_[counts, strip_counts]).astype(np.int64)
+        self._background_color, self.background_confidence = most_common_color(colors, counts)
+
+    def _detect_palette_background(self):
+        """Sum per-strip palette index histograms"""
+        index_counts = np.zeros(256, dtype=np.int64)
+        for y0, indices in self.strips():
+            index_counts += np.bincount(self._samples(y0, indices), minlength=256)
+        self._background_color, self.background_confidence = \
+            palette_background_from_counts(index_counts, self.palette)
+
+    @property
+    def mask(self):
+        raise ValueError("StripAnalysis never builds a whole-sheet mask; use strip_mask")
+
+    @property
+    def components(self):
+        """Connected components (count, bounds, areas), labeled strip by strip"""
+        if self._components is None:
+            masks = ((y0, self.strip_mask(pixels)) for y0, pixels in self.strips())
+            self._components = label_strips(masks, self.width, self.connectivity)
+        return self._components
+
+    @property
+    def labels(self):
+        raise ValueError("StripAnalysis does not keep runs, so it cannot paint a label image")
+
+    def cut(self, x, y, width, height, clear_color=True):
+        """Cut and key one sprite, reading only its own region of the sheet"""
+        region = self.read(x, y, width, height)
+        if self.indexed:
+            return self.indexed_sprite(region)
+        keyed = key_pixels(region, self.strip_mask(region), clear_color)
+        return Image.fromarray(keyed, 'RGBA')
+
+    def content_hash(self):
+        """Hash of the source, read strip by strip when there is no file"""
+        if self.path:
+            return hash_file(self.path)
+        digest = hashlib.sha256()
+        for _, pixels in self.strips():
+            digest.update(pixels.tobytes())
+        return digest.hexdigest()
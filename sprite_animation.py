@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Sprite Animation - Group sprite frames into rows and animation sequences
+Rows are found with a sorted sweep down the sheet, sequences are runs of
+same-sized frames within a row, and each sequence is exported as one
+horizontal strip animated with CSS steps() keyframes.
+"""
+
+from PIL import Image
+
+def cluster_rows(sprites, gap=0):
+    """
+    Group sprites (dicts with x, y, width, height) into rows.
+
+    Sprites are swept top to bottom; a sprite joins the current row when it
+    starts within gap pixels of the row's lowest edge so far, so rows follow
+    the sheet's actual layout instead of fixed bands.
+    Returns a list of rows, each sorted left to right.
+    """
+    rows = []
+    bottom = None
+    for sprite in sorted(sprites, key=lambda s: (s['y'], s['x'])):
+        if rows and sprite['y'] < bottom + gap:
+            rows[-1].append(sprite)
+            bottom = max(bottom, sprite['y'] + sprite['height'])
+        else:
+            rows.append([sprite])
+            bottom = sprite['y'] + sprite['height']
+
+    for row in rows:
+        row.sort(key=lambda s: s['x'])
+    return rows
+
+def find_sequences(row, size_tolerance=2, min_frames=2):
+    """
+    Split a row (sorted left to right) into animation sequences: runs of
+    neighbouring frames whose width and height differ from the first
+    frame's by at most size_tolerance. Runs shorter than min_frames are dropped.
+    """
+    sequences = []
+    current = []
+    for sprite in row:
+        if current and (abs(sprite['width'] - current[0]['width']) <= size_tolerance
+                        and abs(sprite['height'] - current[0]['height']) <= size_tolerance):
+            current.append(sprite)
+            continue
+        if len(current) >= min_frames:
+            sequences.append(current)
+        current = [sprite]
+
+    if len(current) >= min_frames:
+        sequences.append(current)
+    return sequences
+
+def build_strip(frames):
+    """
+    Paste frames left to right into one transparent strip of equal cells,
+    each frame centered in its cell.
+    Returns (strip, cell_width, cell_height)
+    """
+    cell_width = max(frame.width for frame in frames)
+    cell_height = max(frame.height for frame in frames)
+    strip = Image.new('RGBA', (cell_width * len(frames), cell_height), (0, 0, 0, 0))
+    for i, frame in enumerate(frames):
+        x = i * cell_width + (cell_width - frame.width) // 2
+        y = (cell_height - frame.height) // 2
+        strip.paste(frame.convert('RGBA'), (x, y))
+    return strip, cell_width, cell_height
+
+def animation_css(css_class, url, cell_width, cell_height, frame_count, frame_time=0.2):
+    """
+    CSS for one element that plays a strip by stepping its background
+    position one cell per frame
+    """
+    return f""".{css_class} {{
+  width: {cell_width}px;
+  height: {cell_height}px;
+  background: url('{url}') no-repeat 0 0;
+  image-rendering: pixelated;
+  animation: {css_class} {frame_count * frame_time:g}s steps({frame_count}) infinite;
+}}
+
+@keyframes {css_class} {{
+  from {{ background-position: 0 0; }}
+  to {{ background-position: -{cell_width * frame_count}px 0; }}
+}}
+
+"""
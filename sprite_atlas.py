@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Sprite Atlas - Packs extracted sprites into one or a few texture atlases
+Uses a skyline bottom-left packer and writes the atlas PNGs, CSS
+background-position rules and a JSON manifest describing every sprite.
+"""
+
+from PIL import Image
+import json
+import os
+
+from build_cache import encode_png, write_if_changed
+
+def _skyline_fit(skyline, index, width, height, bin_width, bin_height):
+    """
+    Return the y at which a width x height rect rests when its left edge is
+    at skyline segment index, or None if it does not fit there
+    """
+    x = skyline[index][0]
+    if x + width > bin_width:
+        return None
+
+    y = 0
+    remaining = width
+    i = index
+    while remaining > 0:
+        y = max(y, skyline[i][1])
+        if y + height > bin_height:
+            return None
+        remaining -= skyline[i][2]
+        i += 1
+    return y
+
+def _skyline_place(skyline, index, x, y, width, height):
+    """Raise the skyline under a rect placed at (x, y)"""
+    skyline.insert(index, [x, y + height, width])
+
+    # Trim or drop the segments now covered by the new one
+    right = x + width
+    i = index + 1
+    while i < len(skyline) and skyline[i][0] < right:
+        overlap = right - skyline[i][0]
+        skyline[i][0] += overlap
+        skyline[i][2] -= overlap
+        if skyline[i][2] <= 0:
+            del skyline[i]
+        else:
+            break
+
+    # Merge neighbouring segments at the same height
+    i = 0
+    while i < len(skyline) - 1:
+        if skyline[i][1] == skyline[i + 1][1]:
+            skyline[i][2] += skyline[i + 1][2]
+            del skyline[i + 1]
+        else:
+            i += 1
+
+def pack_rects(sizes, bin_width, bin_height):
+    """
+    Pack (width, height) rects into as few bin_width x bin_height bins as needed.
+    Returns placements where placements[i] is the (bin, x, y) of rect i.
+    """
+    placements = [None] * len(sizes)
+    skylines = []
+
+    # Tallest first keeps the skyline flat
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    for i in order:
+        width, height = sizes[i]
+        if width > bin_width or height > bin_height:
+            raise ValueError(f"Sprite of {width}x{height} does not fit in a "
+                             f"{bin_width}x{bin_height} atlas")
+
+        for b in range(len(skylines) + 1):
+            if b == len(skylines):
+                skylines.append([[0, 0, bin_width]])
+            skyline = skylines[b]
+
+            # Bottom-left rule: lowest resting position, then leftmost
+            best = None
+            for index in range(len(skyline)):
+                y = _skyline_fit(skyline, index, width, height, bin_width, bin_height)
+                if y is not None and (best is None or (y, skyline[index][0]) < best[:2]):
+                    best = (y, skyline[index][0], index)
+
+            if best is not None:
+                y, x, index = best
+                _skyline_place(skyline, index, x, y, width, height)
+                placements[i] = (b, x, y)
+                break
+
+    return placements
+
+def bin_extents(sizes, placements):
+    """Width and height actually used in each bin"""
+    extents = []
+    for (width, height), (b, x, y) in zip(sizes, placements):
+        while len(extents) <= b:
+            extents.append([0, 0])
+        extents[b][0] = max(extents[b][0], x + width)
+        extents[b][1] = max(extents[b][1], y + height)
+    return extents
+
+def choose_atlas_layout(sizes, max_size=2048):
+    """
+    Try power-of-two bin widths and keep the layout with the least total
+    atlas area (ties go to fewer atlases).
+    Returns (placements, extents), both empty when there is nothing to pack
+    """
+    if not sizes:
+        return [], []
+    widest = max(width for width, _ in sizes)
+    candidates = []
+    width = 1
+    while width < max_size:
+        if width >= widest:
+            candidates.append(width)
+        width *= 2
+    candidates.append(max_size)
+
+    best = None
+    for bin_width in candidates:
+        placements = pack_rects(sizes, bin_width, max_size)
+        extents = bin_extents(sizes, placements)
+        score = (sum(w * h for w, h in extents), len(extents))
+        if best is None or score < best[0]:
+            best = (score, placements, extents)
+
+    return best[1], best[2]
+
+def pack_atlas(sprite_info, sprite_images, output_dir, name="atlas",
+               max_size=2048, padding=1, css_class="plane", url_prefix="."):
+    """
+    Pack sprites into atlas PNGs and write the matching CSS and JSON manifest.
+
+    Args:
+        sprite_info: Sprite dicts from extract_sprites (filename, width, height, ...);
+            entries with alias_of reuse the rect of the sprite they duplicate
+        sprite_images: RGBA image for each entry of sprite_info
+        output_dir: Directory for the atlas files
+        name: Base name of the atlas, CSS and manifest files
+        max_size: Largest atlas width or height in pixels
+        padding: Transparent gap kept around every sprite
+        css_class: Class the generated CSS rules select on
+        url_prefix: Path from the CSS, which is written to output_dir, to the
+            atlas files (default: '.')
+
+    Returns the manifest dict
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Padding goes on the right and bottom of each rect, then is trimmed
+    # off the atlas edges
+    packed = [i for i, info in enumerate(sprite_info) if not info.get('alias_of')]
+    sizes = [(sprite_images[i].width + padding, sprite_images[i].height + padding) for i in packed]
+    placements, extents = choose_atlas_layout(sizes, max_size + padding)
+
+    # Draw every sprite into its atlas
+    atlas_files = []
+    atlases = []
+    for b, (width, height) in enumerate(extents):
+        filename = f"{name}.png" if len(extents) == 1 else f"{name}_{b+1}.png"
+        atlas_files.append(filename)
+        atlases.append(Image.new('RGBA', (width - padding, height - padding), (0, 0, 0, 0)))
+
+    placement_of = {}
+    for i, (b, x, y) in zip(packed, placements):
+        atlases[b].paste(sprite_images[i].convert('RGBA'), (x, y))
+        placement_of[os.path.splitext(sprite_info[i]['filename'])[0]] = (b, x, y)
+
+    sprites = {}
+    for info, img in zip(sprite_info, sprite_images):
+        sprite_name = info.get('name', os.path.splitext(info['filename'])[0])
+        b, x, y = placement_of[info.get('alias_of', sprite_name)]
+        sprites[sprite_name] = {
+            'atlas': atlas_files[b],
+            'x': x,
+            'y': y,
+            'width': img.width,
+            'height': img.height,
+            'original_x': info.get('original_x'),
+            'original_y': info.get('original_y'),
+        }
+        if info.get('alias_of'):
+            sprites[sprite_name]['alias_of'] = info['alias_of']
+
+    # Packing efficiency: how much of each atlas is actual sprite
+    atlas_entries = []
+    total_sprite_area = 0
+    total_atlas_area = 0
+    for filename, atlas in zip(atlas_files, atlases):
+        write_if_changed(os.path.join(output_dir, filename), encode_png(atlas))
+        sprite_area = sum(s['width'] * s['height'] for s in sprites.values()
+                          if s['atlas'] == filename and not s.get('alias_of'))
+        atlas_area = atlas.width * atlas.height
+        total_sprite_area += sprite_area
+        total_atlas_area += atlas_area
+        atlas_entries.append({
+            'file': filename,
+            'width': atlas.width,
+            'height': atlas.height,
+            'efficiency': round(sprite_area / atlas_area, 4),
+        })
+        print(f"Packed {filename} ({atlas.width}x{atlas.height}, "
+              f"{sprite_area / atlas_area:.1%} used)")
+
+    manifest = {
+        'atlases': atlas_entries,
+        'padding': padding,
+        'efficiency': round(total_sprite_area / total_atlas_area, 4) if total_atlas_area else 0,
+        'sprites': sprites,
+    }
+
+    manifest_path = os.path.join(output_dir, f"{name}.json")
+    write_if_changed(manifest_path, json.dumps(manifest, indent=2).encode())
+
+    generate_atlas_css(manifest, output_dir, name, css_class, url_prefix)
+
+    print(f"Packed {len(packed)} sprites into {len(atlases)} atlas(es), "
+          f"{manifest['efficiency']:.1%} packing efficiency")
+    print(f"Generated manifest: {manifest_path}")
+
+    return manifest
+
+def generate_atlas_css(manifest, output_dir, name="atlas", css_class="plane", url_prefix="."):
+    """Generate CSS that draws each sprite from its atlas via background-position"""
+    css_content = f"""/* Atlas sprite styles */
+.{css_class} {{
+  position: absolute;
+  image-rendering: pixelated;
+  transform: rotate(180deg); /* Point downwards */
+}}
+
+"""
+
+    for i, (sprite_name, sprite) in enumerate(manifest['sprites'].items()):
+        if sprite.get('alias_of'):
+            css_content += f"/* {sprite_name} is a duplicate of {sprite['alias_of']} */\n"
+        css_content += f""".{css_class}:nth-child({i+1}) {{
+  width: {sprite['width']}px;
+  height: {sprite['height']}px;
+  background: url('{url_prefix}/{sprite['atlas']}') no-repeat;
+  background-position: -{sprite['x']}px -{sprite['y']}px;
+}}
+
+"""
+
+    css_path = os.path.join(output_dir, f"{name}.css")
+    if write_if_changed(css_path, css_content.encode()):
+        print(f"Generated CSS file: {css_path}")
+    else:
+        print(f"CSS file unchanged: {css_path}")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Sprite Dedupe - Find identical and near-identical extracted sprites
+Exact duplicates are found by hashing the keyed pixels; near-duplicates by
+a difference hash (dHash) of the sprite's luminance, confirmed with a
+per-pixel comparison so recolored variants of a frame stay separate.
+"""
+
+from PIL import Image
+import hashlib
+import numpy as np
+
+def exact_hash(image):
+    """Hash of an image's mode, size, pixels and (for P mode) palette and tRNS"""
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    if image.mode == 'P':
+        digest.update(bytes(image.getpalette() or []))
+        digest.update(repr(image.info.get('transparency')).encode())
+    return digest.hexdigest()
+
+def perceptual_hash(image, hash_size=8):
+    """
+    Difference hash: shrink the alpha-weighted luminance to
+    (hash_size + 1) x hash_size and keep one bit per horizontal gradient.
+    Returns the hash as an int of hash_size * hash_size bits.
+    """
+    rgba = np.asarray(image.convert('RGBA'), dtype=np.float32)
+    luminance = (rgba[..., :3] @ np.array([0.299, 0.587, 0.114], dtype=np.float32)) * (rgba[..., 3] / 255)
+    small = np.asarray(Image.fromarray(luminance, 'F').resize((hash_size + 1, hash_size), Image.BILINEAR))
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+def mean_pixel_difference(image_a, image_b):
+    """Mean absolute RGBA difference per channel between two same-sized images"""
+    a = np.asarray(image_a.convert('RGBA'), dtype=np.int16)
+    b = np.asarray(image_b.convert('RGBA'), dtype=np.int16)
+    return float(np.abs(a - b).mean())
+
+def find_duplicates(images, mode='exact', threshold=4, max_difference=2.0):
+    """
+    Map every image onto the first image it duplicates.
+
+    mode is 'exact' (identical pixels) or 'perceptual', which also merges
+    same-sized images whose dHashes differ by at most threshold bits and
+    whose mean per-channel pixel difference is at most max_difference.
+    Returns canonical where canonical[i] is the index image i aliases
+    (i itself for unique images).
+    """
+    if mode not in ('exact', 'perceptual'):
+        raise ValueError(f"Unknown dedupe mode: {mode}")
+
+    canonical = []
+    by_hash = {}
+    representatives = {}  # size -> [(perceptual hash, index)]
+    for i, image in enumerate(images):
+        key = exact_hash(image)
+        if key in by_hash:
+            canonical.append(by_hash[key])
+            continue
+
+        match = i
+        if mode == 'perceptual':
+            phash = perceptual_hash(image)
+            candidates = representatives.setdefault(image.size, [])
+            for other_hash, j in candidates:
+                if (hamming_distance(phash, other_hash) <= threshold
+                        and mean_pixel_difference(image, images[j]) <= max_difference):
+                    match = j
+                    break
+            if match == i:
+                candidates.append((phash, i))
+
+        by_hash[key] = match
+        canonical.append(match)
+
+    return canonical
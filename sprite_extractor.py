@@ -5,32 +5,74 @@ Detects sprites by finding connected regions of non-background pixels
 """
 
 from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import glob
+import json
 import os
-from collections import Counter
-import numpy as np
+import re
+import time
 
-def get_background_color(image):
+from asset_encoder import image_set_css, picture_entry, savings_report, write_asset
+from build_cache import (build_key, encode_png, hash_bytes, hash_file, load_manifest,
+                         save_manifest, stage_is_current, write_if_changed)
+from decode_cache import CachedSheetAnalysis
+from pipeline_stats import PipelineStats
+from sprite_atlas import pack_atlas
+from sprite_dedupe import find_duplicates
+from sprite_grid import detect_grid, grid_sprite_bounds
+from sprite_index import write_sprite_index
+from sheet_analysis import SheetAnalysis, detect_background_color
+from sheet_strips import StripAnalysis
+from sprite_labeling import foreground_mask, label_components
+from sprite_segmentation import xy_cut
+
+def get_background_color(image, mode='histogram'):
     """
     Detect the background color (most common color in the image)
+
+    mode is 'histogram' (every pixel), 'border' (edges and a grid of
+    sample lines) or 'counter' (the original Python Counter scan).
     """
-    # Convert to RGB if needed
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    # Get all pixels
-    pixels = list(image.getdata())
-    
-    # Count occurrences of each color
-    color_counts = Counter(pixels)
-    
-    # Return the most common color
-    background_color = color_counts.most_common(1)[0][0]
-    print(f"Detected background color: RGB{background_color}")
+    background_color, confidence = detect_background_color(image, mode)
+    print(f"Detected background color: RGB{background_color} "
+          f"(confidence {confidence:.0%})")
     return background_color
 
-def find_sprite_bounds(image, background_color, tolerance=10):
+def find_sprite_bounds(image, background_color, tolerance=10, backend='numpy',
+                       connectivity=8, min_size=10):
     """
     Find bounding boxes of all sprites in the image
+
+    backend selects the labeling engine: 'numpy' (run-based union-find),
+    'xycut' (recursive projection-profile cuts, for sheets laid out in
+    rows; touching sprites come back as one box) or 'python' (the original
+    flood fill, kept as the reference implementation).
+    connectivity is 4 or 8. Sprites must be wider and taller than min_size.
+    """
+    if backend == 'python':
+        return find_sprite_bounds_reference(image, background_color, tolerance,
+                                            connectivity, min_size)
+    if backend not in ('numpy', 'xycut'):
+        raise ValueError(f"Unknown labeling backend: {backend}")
+
+    mask = foreground_mask(image, background_color, tolerance)
+    if backend == 'xycut':
+        return xy_cut(mask, min_size=min_size)
+    components = label_components(mask, connectivity)
+
+    sprites = []
+    for min_x, min_y, max_x, max_y in components['bounds'].tolist():
+        # Only include if the sprite is reasonably sized
+        if max_x - min_x + 1 > min_size and max_y - min_y + 1 > min_size:
+            sprites.append((min_x, min_y, max_x, max_y))
+
+    return sprites
+
+def find_sprite_bounds_reference(image, background_color, tolerance=10,
+                                 connectivity=8, min_size=10):
+    """
+    Find bounding boxes of all sprites with a pure-Python flood fill
     """
     # Ensure image is in RGB mode
     if image.mode != 'RGB':
@@ -40,6 +82,13 @@ def find_sprite_bounds(image, background_color, tolerance=10):
     pixels = image.load()
     visited = [[False for _ in range(width)] for _ in range(height)]
     sprites = []
+
+    if connectivity == 8:
+        neighbors = [(dx, dy) for dx in [-1, 0, 1] for dy in [-1, 0, 1] if dx or dy]
+    elif connectivity == 4:
+        neighbors = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    else:
+        raise ValueError(f"connectivity must be 4 or 8, got {connectivity}")
     
     def is_background(color):
         """Check if a color is close to the background color"""
@@ -71,12 +120,9 @@ def find_sprite_bounds(image, background_color, tolerance=10):
             min_y = min(min_y, cy)
             max_y = max(max_y, cy)
             
-            # Check 8 neighbors
-            for dx in [-1, 0, 1]:
-                for dy in [-1, 0, 1]:
-                    if dx == 0 and dy == 0:
-                        continue
-                    stack.append((cx + dx, cy + dy))
+            # Check neighbors
+            for dx, dy in neighbors:
+                stack.append((cx + dx, cy + dy))
         
         return min_x, min_y, max_x, max_y
     
@@ -88,110 +134,550 @@ def find_sprite_bounds(image, background_color, tolerance=10):
                 # Only include if the sprite is reasonably sized
                 sprite_width = bounds[2] - bounds[0] + 1
                 sprite_height = bounds[3] - bounds[1] + 1
-                if sprite_width > 10 and sprite_height > 10:
+                if sprite_width > min_size and sprite_height > min_size:
                     sprites.append(bounds)
     
     return sprites
 
-def extract_sprites(image_path, output_dir="sprites"):
+def extract_sprites(image_path, output_dir="sprites", analysis=None, atlas=False,
+                    tolerance=10, min_size=10, connectivity=8, cache=True,
+                    workers=1, compress_level=6, name="plane", url_prefix=".",
+                    palette=False, strip_height=None, dedupe=None, dedupe_threshold=4,
+                    dedupe_max_difference=2.0, formats=None, grid=False, decode_cache=None,
+                    stats=None):
     """
     Extract all sprites from the sprite sheet
+
+    Pass a SheetAnalysis to reuse an already decoded and labeled sheet
+    (its tolerance and connectivity then take precedence).
+    With atlas, the sprites are also packed into atlas.png with a
+    matching atlas.css and atlas.json manifest.
+    With cache, stages whose source hash and parameters are unchanged
+    since the last run are skipped, and files are only rewritten when
+    their bytes differ.
+    PNG encoding runs on a pool of workers processes (1 encodes inline,
+    None uses every CPU) at the given zlib compress_level (0-9).
+    name prefixes the sprite filenames and is the CSS class; url_prefix is
+    the path the CSS uses to reach output_dir (default: '.', since url()
+    resolves against the CSS file, which is written to output_dir).
+    With palette, indexed sheets stay in palette space and the sprites
+    are written as indexed PNGs.
+    With strip_height, the sheet is read, masked and labeled in strips of
+    that many rows so very large sheets extract in bounded memory.
+    dedupe ('exact' or 'perceptual', see sprite_dedupe.find_duplicates)
+    writes each distinct sprite once; duplicates become aliases that
+    point at the first copy in the CSS, atlas and manifest.
+    formats (e.g. ['png', 'png8', 'webp']) tries each lossless encoding per
+    sprite instead of a plain PNG: the smallest PNG is kept, plus a WebP
+    when that is smaller still, served through image-set() and described
+    in encodings.json for <picture> markup.
+    With grid, a sheet whose cells sit on a regular pitch with clean
+    gutters both ways (see sprite_grid.detect_grid) is sliced by cell
+    arithmetic instead of component labeling; other sheets are labeled.
+    decode_cache names a directory where the decoded pixels, mask and
+    labels are kept as memory-mapped .npy files (see decode_cache), so
+    later runs over the same sheet skip decoding and labeling.
+    Every run also writes sprite_index.json, a grid index of the sprites'
+    sheet bounds for point and rectangle lookups (see sprite_index).
+    Pass a PipelineStats as stats to collect per-stage timings and counters.
     """
+    stats = stats or PipelineStats(enabled=False)
+    
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
     
-    # Load the image
-    print(f"Loading sprite sheet: {image_path}")
-    image = Image.open(image_path)
+    if analysis is not None:
+        tolerance, connectivity = analysis.tolerance, analysis.connectivity
+        palette = analysis.indexed
     
-    # Convert to RGB for consistent processing
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
+    # Key the extraction on the source bytes and detection parameters
+    with stats.stage('cache_check'):
+        manifest = load_manifest(output_dir) if cache else {}
+        source_hash = hash_file(image_path) if analysis is None else analysis.content_hash()
+        sprites_key = build_key(source_hash, tolerance=tolerance, min_size=min_size,
+                                connectivity=connectivity, compress_level=compress_level,
+                                name=name, url_prefix=url_prefix, palette=palette,
+                                dedupe=dedupe, dedupe_threshold=dedupe_threshold,
+                                dedupe_max_difference=dedupe_max_difference,
+                                formats=sorted(formats) if formats else None, grid=grid)
+        sprites_current = cache and stage_is_current(manifest, 'sprites', sprites_key, output_dir)
+    
+    sprite_images = None
+    if sprites_current:
+        print(f"Sprites in {output_dir} are up to date, skipping extraction")
+        sprite_info = manifest['sprites']['sprite_info']
+        stats.count('stages_skipped')
+    else:
+        # Load the image once; everything else is derived from this analysis
+        if analysis is None:
+            print(f"Loading sprite sheet: {image_path}")
+            with stats.stage('decode'):
+                if strip_height:
+                    analysis = StripAnalysis(image_path, tolerance=tolerance, connectivity=connectivity,
+                                             palette=palette, strip_height=strip_height)
+                elif decode_cache:
+                    analysis = CachedSheetAnalysis(image_path, tolerance=tolerance,
+                                                   connectivity=connectivity, palette=palette,
+                                                   cache_dir=decode_cache, source_hash=source_hash)
+                else:
+                    analysis = SheetAnalysis(image_path, tolerance=tolerance,
+                                             connectivity=connectivity, palette=palette)
+        
+        sprite_info, sprite_images, outputs = export_sprites(analysis, output_dir, min_size,
+                                                             workers, compress_level,
+                                                             name, url_prefix, stats,
+                                                             dedupe, dedupe_threshold,
+                                                             dedupe_max_difference, formats, grid)
+        manifest['sprites'] = {
+            'key': sprites_key,
+            'sprite_info': sprite_info,
+            'outputs': outputs,
+        }
+    
+    # Map sheet coordinates to sprites without rescanning pixels
+    write_sprite_index(sprite_info, output_dir)
+    
+    # Pack everything into a single atlas so pages need one request
+    if atlas:
+        atlas_key = build_key(sprites_key, stage='atlas')
+        if cache and stage_is_current(manifest, 'atlas', atlas_key, output_dir):
+            print("Atlas is up to date, skipping packing")
+            stats.count('stages_skipped')
+        else:
+            if sprite_images is None:
+                sprite_images = [Image.open(os.path.join(output_dir, info['filename']))
+                                 for info in sprite_info]
+            with stats.stage('atlas'):
+                atlas_manifest = pack_atlas(sprite_info, sprite_images, output_dir,
+                                            css_class=name, url_prefix=url_prefix)
+            atlas_files = [entry['file'] for entry in atlas_manifest['atlases']]
+            manifest['atlas'] = {
+                'key': atlas_key,
+                'outputs': {filename: hash_file(os.path.join(output_dir, filename))
+                            for filename in atlas_files + ['atlas.json', 'atlas.css']},
+            }
+    
+    if cache:
+        save_manifest(output_dir, manifest)
+    
+    return sprite_info
+
+def export_sprites(analysis, output_dir, min_size=10, workers=1, compress_level=6,
+                   name="plane", url_prefix=".", stats=None, dedupe=None,
+                   dedupe_threshold=4, dedupe_max_difference=2.0, formats=None, grid=False):
+    """
+    Detect, cut and save every sprite of an analysed sheet, plus sprites.css.
+    With dedupe, duplicate sprites are not written; their sprite_info
+    entries get their own name, alias_of and the filename of the copy.
+    With formats, sprites that are smallest as WebP also get a webp entry.
+    With grid, confidently gridded sheets are sliced per cell, not labeled.
+    Returns (sprite_info, sprite_images, outputs) where outputs maps each
+    written filename to the hash of its contents.
+    """
+    stats = stats or PipelineStats(enabled=False)
     
     # Detect background color
-    background_color = get_background_color(image)
+    with stats.stage('background'):
+        background_color = analysis.background_color
+    print(f"Detected background color: RGB{background_color}")
     
     # Find all sprites
     print("Detecting sprites...")
-    sprite_bounds = find_sprite_bounds(image, background_color)
+    if not analysis.streaming:
+        # Strip analyses build their masks strip by strip while labeling
+        with stats.stage('mask'):
+            analysis.mask
+    layout = None
+    if grid and not analysis.streaming:
+        # Regular sheets are cut by cell arithmetic, with no labeling at all
+        with stats.stage('grid'):
+            layout = detect_grid(analysis.mask)
+            sprite_bounds = None
+            if layout['confident']:
+                # None when a cell holds more than one sprite (or a wrong pitch)
+                sprite_bounds = grid_sprite_bounds(analysis.mask, layout, min_size)
+        if sprite_bounds is not None:
+            print(f"Detected {layout['pitch_x']}x{layout['pitch_y']}px grid "
+                  f"(confidence {min(layout['confidence_x'], layout['confidence_y']):.0%})")
+            stats.count('grid_cells_sliced', len(sprite_bounds))
+        elif layout['confident']:
+            print("Some grid cells hold several sprites, labeling components instead")
+            layout = None
+        else:
+            print("No confident grid, labeling components instead")
+            layout = None
+    
+    if layout is None:
+        with stats.stage('labeling'):
+            components = analysis.components
+            sprite_bounds = analysis.sprite_bounds(min_size)
+        stats.count('components_found', components['count'])
+        stats.count('components_filtered', components['count'] - len(sprite_bounds))
     print(f"Found {len(sprite_bounds)} sprites")
+    stats.count('pixels_scanned', analysis.width * analysis.height)
     
     # Sort sprites by position (top to bottom, left to right)
     sprite_bounds.sort(key=lambda b: (b[1], b[0]))
     
-    # Extract and save each sprite
+    # Cut every already keyed sprite out of the sheet
     sprite_info = []
-    for i, (min_x, min_y, max_x, max_y) in enumerate(sprite_bounds):
-        # Crop the sprite
-        sprite = image.crop((min_x, min_y, max_x + 1, max_y + 1))
-        
-        # Convert to RGBA for transparency
-        sprite_rgba = Image.new('RGBA', sprite.size, (0, 0, 0, 0))
-        sprite_rgba.paste(sprite)
-        
-        # Make background transparent
-        pixels = sprite_rgba.load()
-        for y in range(sprite_rgba.height):
-            for x in range(sprite_rgba.width):
-                if is_background_similar(pixels[x, y][:3], background_color, tolerance=10):
-                    pixels[x, y] = (0, 0, 0, 0)
-        
-        # Save the sprite
-        filename = f"plane_{i+1}.png"
-        filepath = os.path.join(output_dir, filename)
-        sprite_rgba.save(filepath)
-        
-        sprite_info.append({
-            'filename': filename,
-            'width': sprite_rgba.width,
-            'height': sprite_rgba.height,
-            'original_x': min_x,
-            'original_y': min_y
-        })
-        
-        print(f"Saved {filename} ({sprite_rgba.width}x{sprite_rgba.height})")
+    sprite_images = []
+    with stats.stage('keying'):
+        for i, (min_x, min_y, max_x, max_y) in enumerate(sprite_bounds):
+            sprite_rgba = analysis.cut(min_x, min_y, max_x - min_x + 1, max_y - min_y + 1)
+            filename = f"{name}_{i+1}.png"
+            
+            sprite_info.append({
+                'filename': filename,
+                'width': sprite_rgba.width,
+                'height': sprite_rgba.height,
+                'original_x': min_x,
+                'original_y': min_y
+            })
+            sprite_images.append(sprite_rgba)
+    
+    # Point duplicates at the first copy instead of writing them again
+    canonical = list(range(len(sprite_info)))
+    if dedupe:
+        with stats.stage('dedupe'):
+            canonical = find_duplicates(sprite_images, dedupe, dedupe_threshold,
+                                        dedupe_max_difference)
+        for i, j in enumerate(canonical):
+            if i != j:
+                info = sprite_info[i]
+                info['name'] = os.path.splitext(info['filename'])[0]
+                info['alias_of'] = os.path.splitext(sprite_info[j]['filename'])[0]
+                info['filename'] = sprite_info[j]['filename']
+    unique = [i for i, j in enumerate(canonical) if i == j]
+    jobs = [(sprite_images[i], os.path.join(output_dir, sprite_info[i]['filename']),
+             compress_level, formats) for i in unique]
+    
+    # Encode and save the sprites, leaving identical files untouched
+    with stats.stage('encode'):
+        results, elapsed = encode_sprites(jobs, workers)
+    
+    outputs = {}
+    sizes = {}
+    encodings = {}
+    written = 0
+    for i, (hashes, changed, size, encoding) in zip(unique, results):
+        info = sprite_info[i]
+        outputs.update(hashes)
+        sizes[i] = size
+        written += changed
+        stats.count('bytes_encoded', size)
+        stats.count('bytes_written', size if changed else 0)
+        if encoding:
+            encodings[os.path.splitext(info['filename'])[0]] = encoding
+            if 'webp' in encoding['files']:
+                info['webp'] = encoding['files']['webp']
+        print(f"Saved {info['filename']} ({info['width']}x{info['height']})")
+    stats.count('sprites_encoded', len(jobs))
+    stats.count('files_written', written)
+    for i, j in enumerate(canonical):
+        if i != j and 'webp' in sprite_info[j]:
+            sprite_info[i]['webp'] = sprite_info[j]['webp']
+    
+    if formats:
+        print("Encoding savings over default PNG:")
+        default_bytes, chosen_bytes = savings_report(encodings)
+        stats.count('bytes_saved_by_format', default_bytes - chosen_bytes)
+        manifest_path = write_encoding_manifest(encodings, output_dir, url_prefix)
+        outputs[os.path.basename(manifest_path)] = hash_file(manifest_path)
+    
+    if dedupe:
+        aliases = len(sprite_info) - len(unique)
+        saved = sum(sizes[j] for i, j in enumerate(canonical) if i != j)
+        stats.count('sprites_deduplicated', aliases)
+        stats.count('bytes_deduplicated', saved)
+        print(f"Deduplicated {len(sprite_info)} sprites into {len(unique)} files: "
+              f"{aliases} fewer files and requests, ~{saved} bytes saved")
+    
+    rate = len(jobs) / elapsed if elapsed > 0 else float('inf')
+    print(f"Encoded {len(jobs)} sprites in {elapsed:.2f}s ({rate:.0f} sprites/s, "
+          f"{workers or os.cpu_count()} worker(s)); {written} files changed")
     
     # Generate CSS file
-    generate_css(sprite_info, output_dir)
+    with stats.stage('css'):
+        css_path = generate_css(sprite_info, output_dir, name, url_prefix)
+    outputs[os.path.basename(css_path)] = hash_file(css_path)
     
-    return sprite_info
+    return sprite_info, sprite_images, outputs
+
+def encode_sprites(jobs, workers=1):
+    """
+    Run encode_sprite over (image, filepath, compress_level, formats) jobs, fanned out
+    over a process pool when workers != 1. Results come back in job order.
+    Returns (results, elapsed_seconds)
+    """
+    start = time.perf_counter()
+    if workers == 1 or len(jobs) <= 1:
+        results = [encode_sprite(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(encode_sprite, jobs, chunksize=max(1, len(jobs) // 32)))
+    return results, time.perf_counter() - start
+
+def encode_sprite(job):
+    """
+    Encode one sprite and write it if its bytes changed: a PNG at
+    compress_level, or with formats the smallest encodings (see
+    asset_encoder.write_asset).
+    Returns ({filename: content_hash}, files_written, encoded_size, encoding)
+    where encoding is the write_asset entry (None without formats)
+    """
+    image, filepath, compress_level, formats = job
+    if formats:
+        entry = write_asset(image, filepath, formats)
+        return entry['hashes'], entry['written'], entry['sizes'][entry['chosen']], entry
+    
+    data = encode_png(image, compress_level=compress_level)
+    return ({os.path.basename(filepath): hash_bytes(data)}, int(write_if_changed(filepath, data)),
+            len(data), None)
 
-def is_background_similar(color1, color2, tolerance=10):
-    """Check if two colors are similar within tolerance"""
-    return all(abs(c1 - c2) <= tolerance for c1, c2 in zip(color1, color2))
+def write_encoding_manifest(encodings, output_dir, url_prefix="."):
+    """
+    Write encodings.json: for every sprite the <picture> sources and
+    fallback src, the chosen format and the size of each candidate
+    """
+    manifest = {}
+    for sprite_name, entry in encodings.items():
+        manifest[sprite_name] = dict(picture_entry(entry, url_prefix),
+                                     chosen=entry['chosen'], sizes=entry['sizes'])
+    
+    manifest_path = os.path.join(output_dir, "encodings.json")
+    write_if_changed(manifest_path, json.dumps(manifest, indent=2).encode())
+    print(f"Generated encoding manifest: {manifest_path}")
+    return manifest_path
 
-def generate_css(sprite_info, output_dir):
+def generate_css(sprite_info, output_dir, css_class="plane", url_prefix="."):
     """Generate CSS for using individual sprites"""
-    css_content = """/* Individual sprite styles */
-.plane {
+    css_content = f"""/* Individual sprite styles */
+.{css_class} {{
   position: absolute;
   image-rendering: pixelated;
   transform: rotate(180deg); /* Point downwards */
-}
+}}
 
 """
     
     for i, info in enumerate(sprite_info):
-        css_content += f""".plane:nth-child({i+1}) {{
+        if info.get('alias_of'):
+            css_content += f"/* {info['name']} is a duplicate of {info['alias_of']} */\n"
+        css_content += f""".{css_class}:nth-child({i+1}) {{
   width: {info['width']}px;
   height: {info['height']}px;
-  background: url('sprites/{info['filename']}') no-repeat center;
+  background: url('{url_prefix}/{info['filename']}') no-repeat center;
   background-size: contain;
-}}
-
 """
+        css_content += image_set_css(info['filename'], info.get('webp'), url_prefix)
+        css_content += "}\n\n"
     
     css_path = os.path.join(output_dir, "sprites.css")
-    with open(css_path, 'w') as f:
-        f.write(css_content)
+    if write_if_changed(css_path, css_content.encode()):
+        print(f"\nGenerated CSS file: {css_path}")
+    else:
+        print(f"\nCSS file unchanged: {css_path}")
     
-    print(f"\nGenerated CSS file: {css_path}")
+    return css_path
 
-if __name__ == "__main__":
-    # Extract sprites from the sprite sheet
-    sprite_info = extract_sprites("images/planes_spritesheet.gif")
+SHEET_EXTENSIONS = ('.gif', '.png', '.bmp', '.jpg', '.jpeg', '.webp')
+
+def find_sheets(patterns):
+    """Expand sprite sheet paths, globs and directories into a sorted list"""
+    sheets = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for entry in os.listdir(pattern):
+                if entry.lower().endswith(SHEET_EXTENSIONS):
+                    sheets.add(os.path.join(pattern, entry))
+        else:
+            matches = glob.glob(pattern)
+            if not matches:
+                print(f"Warning: no sprite sheets match {pattern}")
+            sheets.update(matches)
+    return sorted(sheets)
+
+def sheet_names(sheets):
+    """Unique, CSS-safe names derived from each sheet's filename"""
+    names = []
+    for sheet in sheets:
+        base = re.sub(r'[^A-Za-z0-9_-]', '_', os.path.splitext(os.path.basename(sheet))[0])
+        name = base
+        n = 2
+        while name in names:
+            name = f"{base}_{n}"
+            n += 1
+        names.append(name)
+    return names
+
+def extract_batch(sheets, output_dir="sprites", jobs=None, collect_stats=False, **options):
+    """
+    Extract several sprite sheets concurrently.
+
+    Each sheet gets its own output_dir/<name>/ directory, sprite filenames
+    and CSS class. jobs is the number of sheets processed at once (None
+    uses every CPU); the remaining options go to extract_sprites. A
+    url_prefix option is the URL of output_dir, so each sheet's name is
+    appended to it.
+    With collect_stats each sheet's result carries its stage stats report.
+    Returns a summary dict covering every sheet.
+    """
+    start = time.perf_counter()
+    tasks = []
+    for sheet, name in zip(sheets, sheet_names(sheets)):
+        sheet_options = dict(options)
+        if 'url_prefix' in options:
+            sheet_options['url_prefix'] = f"{options['url_prefix'].rstrip('/')}/{name}"
+        tasks.append((sheet, os.path.join(output_dir, name), name, collect_stats, sheet_options))
+    
+    if jobs == 1 or len(tasks) <= 1:
+        results = [extract_sheet(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(extract_sheet, tasks))
+    
+    summary = {
+        'sheets': results,
+        'sheet_count': len(results),
+        'failed': sum(1 for r in results if r['error']),
+        'sprite_count': sum(r['sprites'] for r in results),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    
+    print("\nBatch summary:")
+    for r in results:
+        status = f"FAILED: {r['error']}" if r['error'] else f"{r['sprites']} sprites"
+        print(f"  {r['sheet']} -> {r['output_dir']}: {status} ({r['seconds']:.2f}s)")
+    print(f"{summary['sprite_count']} sprites from {summary['sheet_count']} sheets "
+          f"in {summary['seconds']:.2f}s ({summary['failed']} failed)")
+    
+    return summary
+
+def extract_sheet(task):
+    """Batch worker: extract one sheet and report how it went"""
+    sheet, output_dir, name, collect_stats, options = task
+    start = time.perf_counter()
+    stats = PipelineStats(enabled=collect_stats)
+    result = {'sheet': sheet, 'name': name, 'output_dir': output_dir, 'sprites': 0, 'error': None}
+    try:
+        result['sprites'] = len(extract_sprites(sheet, output_dir, name=name, stats=stats, **options))
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    if collect_stats:
+        result['stats'] = stats.report()
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract individual sprites from sprite sheets")
+    parser.add_argument('sheets', nargs='*',
+                        help="Sprite sheets, globs or directories (default: images/planes_spritesheet.gif)")
+    parser.add_argument('-o', '--output-dir', default='sprites',
+                        help="Output directory; in batch mode each sheet gets a subdirectory")
+    parser.add_argument('--batch', action='store_true',
+                        help="Namespace the output per sheet even for a single sheet")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="Sheets to process concurrently in batch mode (default: all CPUs)")
+    parser.add_argument('--summary', help="Write the batch summary as JSON to this file")
+    parser.add_argument('--url-prefix', metavar='URL',
+                        help="URL of the output directory as seen from the CSS "
+                             "(default: '.', i.e. next to the CSS file)")
+    parser.add_argument('--atlas', action='store_true', help="Also pack the sprites into an atlas")
+    parser.add_argument('--tolerance', type=int, default=10)
+    parser.add_argument('--min-size', type=int, default=10)
+    parser.add_argument('--connectivity', type=int, choices=[4, 8], default=8)
+    parser.add_argument('--workers', type=int, default=1, help="PNG encoding processes per sheet")
+    parser.add_argument('--compress-level', type=int, default=6, choices=range(10))
+    parser.add_argument('--palette', action='store_true',
+                        help="Keep indexed sheets in palette space and write indexed PNGs")
+    parser.add_argument('--strip-height', type=int, default=None, metavar='ROWS',
+                        help="Label the sheet in strips of this many rows to bound memory "
+                             "on very large sheets (.npy pixel arrays are memory-mapped)")
+    parser.add_argument('--dedupe', choices=['exact', 'perceptual'],
+                        help="Write duplicate sprites once and alias the copies")
+    parser.add_argument('--dedupe-threshold', type=int, default=4,
+                        help="Max dHash bit distance for perceptual duplicates")
+    parser.add_argument('--dedupe-max-difference', type=float, default=2.0,
+                        help="Max mean per-channel pixel difference for perceptual duplicates")
+    parser.add_argument('--formats', nargs='+', choices=['png', 'png8', 'webp'],
+                        help="Try these lossless encodings per sprite and keep the smallest "
+                             "(a PNG is always kept as the fallback)")
+    parser.add_argument('--grid', action='store_true',
+                        help="Slice sheets laid out on a regular grid by cell instead of "
+                             "labeling components (falls back to labeling otherwise)")
+    parser.add_argument('--decode-cache', metavar='DIR',
+                        help="Keep decoded pixels, masks and labels here as memory-mapped "
+                             ".npy files so later runs skip decoding (off by default)")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="Rebuild everything even if inputs are unchanged "
+                             "(also bypasses the decode cache)")
+    parser.add_argument('--stats', metavar='FILE',
+                        help="Write per-stage wall/CPU time and counters as JSON")
+    parser.add_argument('--profile-stage', metavar='STAGE',
+                        help="Run one stage (decode, background, mask, grid, labeling, keying, "
+                             "dedupe, encode, css, atlas) under cProfile (single sheet only)")
+    parser.add_argument('--profile-out', metavar='FILE',
+                        help="Save the --profile-stage profile here instead of printing it")
+    args = parser.parse_args(argv)
+    
+    stats = PipelineStats(enabled=bool(args.stats or args.profile_stage),
+                          profile_stage=args.profile_stage, profile_path=args.profile_out)
+    
+    options = {
+        'atlas': args.atlas,
+        'tolerance': args.tolerance,
+        'min_size': args.min_size,
+        'connectivity': args.connectivity,
+        'cache': args.cache,
+        'workers': args.workers,
+        'compress_level': args.compress_level,
+        'palette': args.palette,
+        'strip_height': args.strip_height,
+        'dedupe': args.dedupe,
+        'dedupe_threshold': args.dedupe_threshold,
+        'dedupe_max_difference': args.dedupe_max_difference,
+        'formats': args.formats,
+        'grid': args.grid,
+        'decode_cache': args.decode_cache if args.cache else None,
+    }
+    if args.url_prefix is not None:
+        options['url_prefix'] = args.url_prefix
+    
+    if not args.sheets:
+        # Extract sprites from the sprite sheet
+        extract_sprites("images/planes_spritesheet.gif", args.output_dir, stats=stats, **options)
+        if args.stats:
+            stats.write(args.stats)
+        
+        print("\nExtraction complete!")
+        print("\nTo use individual sprites, update your HTML to include:")
+        css_href = os.path.join(args.output_dir, 'sprites.css').replace(os.sep, '/')
+        print(f'  <link rel="stylesheet" href="{css_href}">')
+        print("\nAnd remove the sprite sheet background-position styles.")
+        return
+    
+    sheets = find_sheets(args.sheets)
+    if len(sheets) == 1 and not args.batch:
+        extract_sprites(sheets[0], args.output_dir, stats=stats, **options)
+        if args.stats:
+            stats.write(args.stats)
+        return
+    
+    # Batch workers each keep their own stats, so there is no one profile to save
+    if args.profile_stage:
+        parser.error("--profile-stage profiles a single sheet; it cannot be used in batch mode")
     
-    print("\nExtraction complete!")
-    print("\nTo use individual sprites, update your HTML to include:")
-    print('  <link rel="stylesheet" href="sprites/sprites.css">')
-    print("\nAnd remove the sprite sheet background-position styles.")
\ No newline at end of file
+    summary = extract_batch(sheets, args.output_dir, args.jobs,
+                            collect_stats=bool(args.stats), **options)
+    if args.stats:
+        with open(args.stats, 'w') as f:
+            json.dump({r['sheet']: r.get('stats') for r in summary['sheets']}, f, indent=2)
+        print(f"Stage stats written to {args.stats}")
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary written to {args.summary}")
+
+if __name__ == "__main__":
+    main()
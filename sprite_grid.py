@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Sprite Grid - Detect the cell pitch and origin of regularly laid out sheets
+The pitch along each axis comes from peaks of the FFT autocorrelation of
+the foreground occupancy profile, and is only accepted when some phase of
+it is empty in every period, i.e. a gutter line can be drawn between all
+cells. A sheet with clean gutters both ways is sliced by arithmetic alone.
+"""
+
+import numpy as np
+
+from sprite_segmentation import occupied_spans
+
+def autocorrelation(profile):
+    """
+    Normalized autocorrelation of a 1-D profile for every lag, computed
+    with one zero-padded FFT and corrected for the shrinking overlap
+    """
+    values = np.asarray(profile, dtype=np.float64)
+    values = values - values.mean()
+    n = len(values)
+    size = 1 << (2 * n - 1).bit_length()
+    spectrum = np.fft.rfft(values, size)
+    correlation = np.fft.irfft(spectrum * np.conj(spectrum), size)[:n]
+    correlation *= n / (n - np.arange(n))
+    if correlation[0] <= 0:
+        return np.zeros(n)
+    return correlation / correlation[0]
+
+def gutter_phase(occupied, pitch):
+    """
+    Phase in [0, pitch) at the middle of the widest run of positions that
+    are empty in every period, or None when no such gutter exists
+    """
+    folded = np.bincount(np.flatnonzero(occupied) % pitch, minlength=pitch)
+    empty = folded == 0
+    if not empty.any():
+        return None
+    if empty.all():
+        return 0
+
+    # Walk the circular profile from an occupied phase so runs do not wrap
+    start = int(np.argmin(empty))
+    best_start, best_length, run_start, run_length = 0, 0, 0, 0
+    for i in range(1, pitch + 1):
+        phase = (start + i) % pitch
+        if empty[phase]:
+            if run_length == 0:
+                run_start = phase
+            run_length += 1
+            if run_length > best_length:
+                best_start, best_length = run_start, run_length
+        else:
+            run_length = 0
+    return (best_start + best_length // 2) % pitch
+
+def estimate_pitch(profile, min_pitch=8, max_pitch=None, candidates=5):
+    """
+    Estimate the cell pitch of a foreground occupancy profile.
+
+    Candidates are the strongest autocorrelation peaks between min_pitch
+    and max_pitch (default: a third of the profile, so at least three
+    periods) and their whole fractions, rounded both down and up since
+    the peak may sit a pixel off a multiple. The smallest candidate with a
+    clean gutter wins, refined to the best correlated clean lag within
+    1/16 of it, since wide gutters leave several nearby pitches clean.
+    Returns (pitch, origin, confidence) where origin is the gutter phase and
+    confidence the autocorrelation at the pitch, or (None, None, 0.0).
+    """
+    profile = np.asarray(profile)
+    length = len(profile)
+    max_pitch = min(max_pitch or length // 3, length // 2 - 1)
+    occupied = profile > 0
+    if max_pitch < min_pitch or not occupied.any():
+        return None, None, 0.0
+
+    # Local maxima past the zero-lag lobe
+    correlation = autocorrelation(profile)
+    lags = np.arange(max(min_pitch, 1), max_pitch)
+    lags = lags[(correlation[lags] >= correlation[lags - 1]) & (correlation[lags] >= correlation[lags + 1])]
+    lags = lags[correlation[lags] > 0]
+    strongest = lags[np.argsort(correlation[lags])[::-1][:candidates]].tolist()
+
+    pitches = set(strongest)
+    for lag in strongest:
+        for d in range(2, lag // min_pitch + 1):
+            pitches.update((lag // d, -(-lag // d)))
+
+    for pitch in sorted(p for p in pitches if p >= min_pitch):
+        if gutter_phase(occupied, pitch) is None:
+            continue
+        nearby = range(max(min_pitch, pitch - pitch // 16), min(max_pitch, pitch + pitch // 16) + 1)
+        pitch = max((lag for lag in nearby if gutter_phase(occupied, lag) is not None),
+                    key=lambda lag: correlation[lag])
+        return pitch, gutter_phase(occupied, pitch), float(max(correlation[pitch], 0.0))
+    return None, None, 0.0
+
+def detect_grid(mask, min_pitch=8, min_confidence=0.25):
+    """
+    Estimate the cell grid of a foreground mask.
+
+    Returns a dict with pitch_x/pitch_y, origin_x/origin_y (a gutter line
+    position) and confidence_x/confidence_y per axis (None and 0.0 where no
+    clean pitch was found), plus confident: True when both axes have one
+    with at least min_confidence, so cells can be sliced arithmetically.
+    """
+    grid = {}
+    for name, axis in (('x', 0), ('y', 1)):
+        pitch, origin, confidence = estimate_pitch(mask.sum(axis=axis), min_pitch)
+        grid[f'pitch_{name}'] = pitch
+        grid[f'origin_{name}'] = origin
+        grid[f'confidence_{name}'] = round(confidence, 4)
+    grid['confident'] = (grid['pitch_x'] is not None and grid['pitch_y'] is not None
+                         and min(grid['confidence_x'], grid['confidence_y']) >= min_confidence)
+    return grid
+
+def grid_lines(length, pitch, origin):
+    """
+    Half-open (start, end) cells along an axis of the given length, with
+    boundaries at origin + k * pitch. A partial leading cell is cell 0.
+    """
+    boundaries = list(range(origin % pitch, length, pitch))
+    if not boundaries or boundaries[0] != 0:
+        boundaries.insert(0, 0)
+    boundaries.append(length)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def axis_cells(mask, axis, min_pitch=8, min_gap=1):
+    """
+    Cells along one axis of a mask (0: columns, 1: rows): grid cells when the
+    occupancy profile has a clean pitch, otherwise its occupied spans
+    """
+    profile = mask.sum(axis=axis)
+    pitch, origin, _ = estimate_pitch(profile, min_pitch)
+    if pitch is None:
+        return occupied_spans(profile > 0, min_gap)
+    return grid_lines(len(profile), pitch, origin)
+
+def grid_sprite_bounds(mask, grid, min_size=10):
+    """
+    Bounding boxes (min_x, min_y, max_x, max_y) of the content of every
+    occupied grid cell, wider and taller than min_size, in raster order.
+    The mask is padded to whole cells and viewed as a (rows, pitch_y,
+    columns, pitch_x) block array, so two reductions give every extent.
+    Returns None when some cell holds more than one occupied span along
+    either axis, i.e. the pitch is a multiple of the real one or a cell
+    holds several sprites, so the sheet should be labeled instead.
+    """
+    height, width = mask.shape
+    pitch_x, pitch_y = grid['pitch_x'], grid['pitch_y']
+
+    # Shift so gutter lines fall on multiples of the pitch
+    lead_x = (pitch_x - grid['origin_x'] % pitch_x) % pitch_x
+    lead_y = (pitch_y - grid['origin_y'] % pitch_y) % pitch_y
+    columns = -(-(width + lead_x) // pitch_x)
+    rows = -(-(height + lead_y) // pitch_y)
+    padded = np.zeros((rows * pitch_y, columns * pitch_x), dtype=bool)
+    padded[lead_y:lead_y + height, lead_x:lead_x + width] = mask
+    blocks = padded.reshape(rows, pitch_y, columns, pitch_x)
+
+    row_hits = blocks.any(axis=3)     # (rows, pitch_y, columns)
+    column_hits = blocks.any(axis=1)  # (rows, columns, pitch_x)
+    # A span starts at every hit that follows a miss or the cell edge
+    row_spans = row_hits[:, 0] + (row_hits[:, 1:] & ~row_hits[:, :-1]).sum(axis=1)
+    column_spans = column_hits[..., 0] + (column_hits[..., 1:] & ~column_hits[..., :-1]).sum(axis=2)
+    if row_spans.max(initial=0) > 1 or column_spans.max(initial=0) > 1:
+        return None
+
+    r, c = np.nonzero(row_hits.any(axis=1))
+
+    top = row_hits.argmax(axis=1)[r, c]
+    bottom = pitch_y - 1 - row_hits[:, ::-1].argmax(axis=1)[r, c]
+    left = column_hits.argmax(axis=2)[r, c]
+    right = pitch_x - 1 - column_hits[..., ::-1].argmax(axis=2)[r, c]
+
+    min_x = c * pitch_x + left - lead_x
+    min_y = r * pitch_y + top - lead_y
+    max_x = c * pitch_x + right - lead_x
+    max_y = r * pitch_y + bottom - lead_y
+    keep = (max_x - min_x + 1 > min_size) & (max_y - min_y + 1 > min_size)
+    return list(zip(min_x[keep].tolist(), min_y[keep].tolist(),
+                    max_x[keep].tolist(), max_y[keep].tolist()))
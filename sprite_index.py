@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Sprite Index - Uniform grid over detected sprite bounds
+Every sprite is bucketed into the grid cells its box overlaps, so mapping
+a point or a rectangle of the sheet to sprites only looks at the few
+boxes in the touched cells instead of rescanning pixels. The index is
+saved as sprite_index.json next to the extraction manifest.
+"""
+
+import json
+import os
+
+from build_cache import write_if_changed
+
+class SpriteIndex:
+    """
+    Point and rectangle lookups over sprite boxes.
+
+    Args:
+        sprites: Dicts with name, x, y, width and height (sheet pixels)
+        cell_size: Grid cell edge in pixels; defaults to the median sprite
+            edge so a sprite typically lands in one to four cells
+    """
+
+    def __init__(self, sprites, cell_size=None):
+        self.sprites = [dict(sprite) for sprite in sprites]
+        if cell_size is None:
+            edges = sorted(max(s['width'], s['height']) for s in self.sprites)
+            cell_size = edges[len(edges) // 2] if edges else 64
+        self.cell_size = max(1, int(cell_size))
+
+        self.cells = {}
+        for i, sprite in enumerate(self.sprites):
+            for cell in self._cells(sprite['x'], sprite['y'], sprite['width'], sprite['height']):
+                self.cells.setdefault(cell, []).append(i)
+
+    @classmethod
+    def from_bounds(cls, bounds, names=None, cell_size=None):
+        """Index inclusive (min_x, min_y, max_x, max_y) boxes, named by position unless names are given"""
+        sprites = []
+        for i, (min_x, min_y, max_x, max_y) in enumerate(bounds):
+            sprites.append({
+                'name': names[i] if names else str(i),
+                'x': int(min_x),
+                'y': int(min_y),
+                'width': int(max_x - min_x + 1),
+                'height': int(max_y - min_y + 1),
+            })
+        return cls(sprites, cell_size)
+
+    @classmethod
+    def from_sprite_info(cls, sprite_info, cell_size=None):
+        """Index the sprite_info entries written by sprite_extractor"""
+        sprites = []
+        for info in sprite_info:
+            sprites.append({
+                'name': info.get('name', os.path.splitext(info['filename'])[0]),
+                'x': info['original_x'],
+                'y': info['original_y'],
+                'width': info['width'],
+                'height': info['height'],
+            })
+        return cls(sprites, cell_size)
+
+    def _cells(self, x, y, width, height):
+        """Grid cells overlapped by a box"""
+        size = self.cell_size
+        for cy in range(y // size, (y + height - 1) // size + 1):
+            for cx in range(x // size, (x + width - 1) // size + 1):
+                yield cx, cy
+
+    def sprite_at(self, x, y):
+        """
+        The sprite whose box contains the point, or None. Where boxes
+        overlap the smallest one wins, as it is the one drawn on top.
+        """
+        hits = [self.sprites[i] for i in self.cells.get((x // self.cell_size, y // self.cell_size), ())
+                if _contains(self.sprites[i], x, y)]
+        if not hits:
+            return None
+        return min(hits, key=lambda s: s['width'] * s['height'])
+
+    def sprites_in_rect(self, x, y, width, height):
+        """Sprites whose boxes intersect the rectangle, in index order"""
+        if width <= 0 or height <= 0:
+            return []
+        found = set()
+        for cell in self._cells(x, y, width, height):
+            found.update(self.cells.get(cell, ()))
+        return [self.sprites[i] for i in sorted(found)
+                if _intersects(self.sprites[i], x, y, width, height)]
+
+    def to_dict(self):
+        """JSON-ready form; cells are keyed "cx,cy" so pages can look them up directly"""
+        return {
+            'cell_size': self.cell_size,
+            'sprites': self.sprites,
+            'cells': {f"{cx},{cy}": indices for (cx, cy), indices in sorted(self.cells.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an index from to_dict output"""
+        return cls(data['sprites'], data['cell_size'])
+
+    def save(self, path):
+        """Write the index as JSON, only touching the file when it changes"""
+        return write_if_changed(path, json.dumps(self.to_dict(), indent=2).encode())
+
+    @classmethod
+    def load(cls, path):
+        """Read an index saved with save"""
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+def _contains(sprite, x, y):
+    return (sprite['x'] <= x < sprite['x'] + sprite['width']
+            and sprite['y'] <= y < sprite['y'] + sprite['height'])
+
+def _intersects(sprite, x, y, width, height):
+    return (sprite['x'] < x + width and x < sprite['x'] + sprite['width']
+            and sprite['y'] < y + height and y < sprite['y'] + sprite['height'])
+
+def write_sprite_index(sprite_info, output_dir, filename="sprite_index.json"):
+    """Save the index of an extraction's sprites alongside its manifest"""
+    index_path = os.path.join(output_dir, filename)
+    SpriteIndex.from_sprite_info(sprite_info).save(index_path)
+    print(f"Generated sprite index: {index_path}")
+    return index_path
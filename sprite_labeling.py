@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Sprite Labeling - NumPy connected-component engine for sprite sheets
+Labels foreground pixels by run-length encoding each row and merging
+overlapping runs between neighbouring rows with a vectorized union-find.
+"""
+
+import numpy as np
+
+def foreground_mask(image, background_color, tolerance=10):
+    """
+    Build a boolean mask that is True wherever a pixel is NOT background
+    (any channel differs from the background color by more than tolerance).
+    image may be a PIL image or an RGB/RGBA pixel array.
+    """
+    if isinstance(image, np.ndarray):
+        pixels = image[..., :3].astype(np.int16)
+    else:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        pixels = np.asarray(image, dtype=np.int16)
+
+    background = np.array(background_color[:3], dtype=np.int16)
+    return np.abs(pixels - background).max(axis=2) > tolerance
+
+def find_runs(mask):
+    """
+    Find horizontal runs of foreground pixels in raster order.
+    Returns (rows, starts, ends) arrays, with ends exclusive.
+    """
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends
+
+def _link_runs(rows, starts, ends, width, connectivity):
+    """
+    Find every pair of runs on neighbouring rows that touch.
+    Returns (a, b) index arrays where run a sits on the row above run b.
+    """
+    reach = 1 if connectivity == 8 else 0
+    stride = width + 2
+    key_starts = rows * stride + starts
+    key_ends = rows * stride + ends
+
+    # Runs are disjoint and in raster order, so the runs on the row above
+    # that touch run j always form one contiguous slice [lo, hi)
+    above = (rows - 1) * stride
+    lo = np.searchsorted(key_ends, above + starts - reach, side='right')
+    hi = np.searchsorted(key_starts, above + ends + reach, side='left')
+    counts = np.maximum(hi - lo, 0)
+
+    total = counts.sum()
+    b = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    a = np.repeat(lo, counts) + offsets
+    return a, b
+
+def _resolve_equivalences(count, a, b):
+    """
+    Union-find over run pairs. Every run ends up pointing at the smallest
+    run index in its component, i.e. the component's first run in raster order.
+    """
+    parent = np.arange(count)
+    while True:
+        root_a = parent[a]
+        root_b = parent[b]
+        if np.array_equal(root_a, root_b):
+            return parent
+
+        # Hook both roots onto the smaller one
+        low = np.minimum(root_a, root_b)
+        np.minimum.at(parent, root_a, low)
+        np.minimum.at(parent, root_b, low)
+
+        # Pointer jumping until every run points straight at its root
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+def label_components(mask, connectivity=8):
+    """
+    Label connected foreground regions of a boolean mask.
+
+    Components are numbered 0..count-1 in the order a raster scan first
+    reaches them, matching the order of the flood-fill reference.
+
+    Returns a dict with:
+        count: number of components
+        bounds: (count, 4) array of min_x, min_y, max_x, max_y
+        areas: pixel count per component
+        runs: (rows, starts, ends) of the foreground runs
+        run_labels: component index of each run
+    """
+    if connectivity not in (4, 8):
+        raise ValueError(f"connectivity must be 4 or 8, got {connectivity}")
+
+    height, width = mask.shape
+    rows, starts, ends = find_runs(mask)
+    a, b = _link_runs(rows, starts, ends, width, connectivity)
+    parent = _resolve_equivalences(len(rows), a, b)
+
+    first_runs, run_labels = np.unique(parent, return_inverse=True)
+    count = len(first_runs)
+
+    min_x = np.full(count, width, dtype=np.int64)
+    max_x = np.full(count, -1, dtype=np.int64)
+    max_y = np.full(count, -1, dtype=np.int64)
+    np.minimum.at(min_x, run_labels, starts)
+    np.maximum.at(max_x, run_labels, ends - 1)
+    np.maximum.at(max_y, run_labels, rows)
+    min_y = rows[first_runs]
+
+    return {
+        'count': count,
+        'bounds': np.stack([min_x, min_y, max_x, max_y], axis=1),
+        'areas': np.bincount(run_labels, weights=ends - starts, minlength=count).astype(np.int64),
+        'runs': (rows, starts, ends),
+        'run_labels': run_labels,
+    }
+
+def label_image(shape, components):
+    """
+    Paint a component label image from labeled runs.
+    Background is 0 and components are numbered from 1, like ndimage.label.
+    """
+    rows, starts, ends = components['runs']
+    lengths = ends - starts
+    labels = np.zeros(shape[0] * shape[1], dtype=np.int32)
+
+    run_offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    flat = np.repeat(rows * shape[1] + starts, lengths) + np.arange(lengths.sum()) - run_offsets
+    labels[flat] = np.repeat(components['run_labels'] + 1, lengths)
+    return labels.reshape(shape)
+
+def label_strips(strips, width, connectivity=8):
+    """
+    Label connected foreground regions of a mask delivered in horizontal strips.
+
+    strips yields (y0, mask_strip) pairs from the top of the sheet down with
+    no gaps. Each strip is labeled on its own, then components touching
+    across a strip seam are merged, so memory holds one strip plus the
+    per-component bounds rather than the whole mask and all of its runs.
+
+    Returns a dict with count, bounds and areas exactly as label_components
+    would for the full mask (runs and run_labels are not kept).
+    """
+    bounds_parts = []
+    area_parts = []
+    seam_a = []
+    seam_b = []
+    next_id = 0
+    previous = None  # (starts, ends, global ids) of the runs on the last row
+
+    for y0, mask in strips:
+        components = label_components(mask, connectivity)
+        rows, starts, ends = components['runs']
+        ids = components['run_labels'] + next_id
+
+        bounds = components['bounds'].copy()
+        bounds[:, [1, 3]] += y0
+        bounds_parts.append(bounds)
+        area_parts.append(components['areas'])
+
+        # Link the first row of this strip to the last row of the one above
+        top = rows == 0
+        if previous is not None and top.any() and len(previous[0]):
+            prev_starts, prev_ends, prev_ids = previous
+            seam_rows = np.r_[np.zeros(len(prev_starts), dtype=np.int64),
+                              np.ones(int(top.sum()), dtype=np.int64)]
+            a, b = _link_runs(seam_rows, np.r_[prev_starts, starts[top]],
+                              np.r_[prev_ends, ends[top]], width, connectivity)
+            seam_a.append(prev_ids[a])
+            seam_b.append(ids[top][b - len(prev_starts)])
+
+        bottom = rows == mask.shape[0] - 1
+        previous = (starts[bottom], ends[bottom], ids[bottom])
+        next_id += components['count']
+
+    if not bounds_parts:
+        return {'count': 0, 'bounds': np.zeros((0, 4), dtype=np.int64),
+                'areas': np.zeros(0, dtype=np.int64)}
+
+    # Strip components are numbered in raster order of their first pixel, so
+    # the smallest id in each merged group is the group's first component
+    a = np.concatenate(seam_a) if seam_a else np.zeros(0, dtype=np.int64)
+    b = np.concatenate(seam_b) if seam_b else np.zeros(0, dtype=np.int64)
+    parent = _resolve_equivalences(next_id, a, b)
+    _, labels = np.unique(parent, return_inverse=True)
+    count = int(labels.max()) + 1 if next_id else 0
+
+    parts = np.concatenate(bounds_parts)
+    bounds = np.empty((count, 4), dtype=np.int64)
+    bounds[:, :2] = np.iinfo(np.int64).max
+    bounds[:, 2:] = -1
+    for column, reduce in ((0, np.minimum), (1, np.minimum), (2, np.maximum), (3, np.maximum)):
+        reduce.at(bounds[:, column], labels, parts[:, column])
+
+    return {
+        'count': count,
+        'bounds': bounds,
+        'areas': np.bincount(labels, weights=np.concatenate(area_parts), minlength=count).astype(np.int64),
+    }
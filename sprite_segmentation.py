@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Sprite Segmentation - Recursive XY-cut over a foreground mask
+Sheets laid out in rows and columns are split on empty bands of their row
+and column occupancy profiles, alternating direction until no region can
+be cut further. Each profile is one vectorized reduction, so no pixel is
+labeled individually; sprites that touch are returned as one box.
+"""
+
+import numpy as np
+
+def occupied_spans(profile, min_gap=1):
+    """
+    Split a boolean occupancy profile into (start, end) half-open spans of
+    occupied entries. Empty gaps shorter than min_gap do not split a span.
+    """
+    occupied = np.flatnonzero(profile)
+    if not len(occupied):
+        return []
+    breaks = np.flatnonzero(occupied[1:] - occupied[:-1] > min_gap)
+    starts = [int(occupied[0])] + occupied[breaks + 1].tolist()
+    ends = (occupied[breaks] + 1).tolist() + [int(occupied[-1]) + 1]
+    return list(zip(starts, ends))
+
+def xy_cut(mask, min_gap=1, min_size=0):
+    """
+    Segment a boolean mask by recursive XY-cut.
+
+    A region is cut into horizontal bands at empty row gaps of at least
+    min_gap rows, each band into columns at empty column gaps of at least
+    min_gap, and so on until a region has one occupied span both ways.
+    Returns bounding boxes (min_x, min_y, max_x, max_y) of the leaves wider
+    and taller than min_size, in raster order of their top-left corner.
+    """
+    height, width = mask.shape
+    boxes = []
+    # (x0, y0, x1, y1, axis): axis 0 cuts rows next, 1 cuts columns
+    pending = [(0, 0, width, height, 0)]
+    while pending:
+        x0, y0, x1, y1, axis = pending.pop()
+        region = mask[y0:y1, x0:x1]
+        spans = occupied_spans(region.any(axis=1 - axis), min_gap)
+        if not spans:
+            continue
+
+        if len(spans) == 1:
+            # Nothing to cut this way; trim to the content and cut the other way
+            start, end = spans[0]
+            if axis == 0:
+                y0, y1 = y0 + start, y0 + end
+            else:
+                x0, x1 = x0 + start, x0 + end
+            spans = occupied_spans(region.any(axis=axis), min_gap)
+            axis = 1 - axis
+            if len(spans) == 1:
+                start, end = spans[0]
+                if axis == 0:
+                    y0, y1 = y0 + start, y0 + end
+                else:
+                    x0, x1 = x0 + start, x0 + end
+                if x1 - x0 > min_size and y1 - y0 > min_size:
+                    boxes.append((x0, y0, x1 - 1, y1 - 1))
+                continue
+
+        for start, end in spans:
+            if axis == 0:
+                pending.append((x0, y0 + start, x1, y0 + end, 1))
+            else:
+                pending.append((x0 + start, y0, x0 + end, y1, 0))
+
+    boxes.sort(key=lambda b: (b[1], b[0]))
+    return boxes
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Sprite Sheet - Lazy access to the sprites of a sheet by index or name
+Nothing is decoded until a sprite is first asked for. Keyed RGBA crops are
+kept in a least-recently-used cache bounded by their pixel bytes, so
+previews and interactive tools can ask for the same frames repeatedly
+without decoding or keying them again.
+"""
+
+from PIL import Image
+from collections import OrderedDict
+
+from sheet_analysis import SheetAnalysis, key_pixels
+
+class SpriteSheet:
+    """
+    A sprite sheet whose sprites are looked up by index or name.
+
+    Args:
+        source: Path to the sheet, an opened PIL image or an existing
+            SheetAnalysis to share
+        background_color, tolerance, connectivity: As for SheetAnalysis
+        min_size: Detected sprites must be wider and taller than this
+        name: Prefix of detected sprite names (name_1, name_2, ... in the
+            top-to-bottom, left-to-right order sprite_extractor uses)
+        frames: {name: (x, y, width, height)} to use instead of detection
+        cache_bytes: Most RGBA bytes of crops kept in the LRU cache
+        clear_color: Zero the RGB of keyed background pixels, not only alpha
+
+    Cached crops are shared between callers, so treat them as read-only.
+    """
+
+    def __init__(self, source, background_color=None, tolerance=10, connectivity=8,
+                 min_size=10, name="plane", frames=None, cache_bytes=32 * 2**20,
+                 clear_color=True):
+        self.source = source
+        self.background_color = background_color
+        self.tolerance = tolerance
+        self.connectivity = connectivity
+        self.min_size = min_size
+        self.name = name
+        self.cache_bytes = cache_bytes
+        self.clear_color = clear_color
+
+        self._analysis = source if isinstance(source, SheetAnalysis) else None
+        self._frames = None
+        if frames is not None:
+            self._frames = [{'name': n, 'x': x, 'y': y, 'width': w, 'height': h}
+                            for n, (x, y, w, h) in frames.items()]
+        self._by_name = None
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def analysis(self):
+        """SheetAnalysis of the sheet, decoded on first use"""
+        if self._analysis is None:
+            self._analysis = SheetAnalysis(self.source, self.background_color,
+                                           self.tolerance, self.connectivity)
+        return self._analysis
+
+    @property
+    def frames(self):
+        """Sprite dicts (name, x, y, width, height), detected on first use"""
+        if self._frames is None:
+            bounds = sorted(self.analysis.sprite_bounds(self.min_size), key=lambda b: (b[1], b[0]))
+            self._frames = [{'name': f"{self.name}_{i + 1}", 'x': min_x, 'y': min_y,
+                             'width': max_x - min_x + 1, 'height': max_y - min_y + 1}
+                            for i, (min_x, min_y, max_x, max_y) in enumerate(bounds)]
+        return self._frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __contains__(self, name):
+        return self.frame(name) is not None
+
+    def frame(self, key):
+        """The sprite dict for an index or name (None for unknown names)"""
+        if isinstance(key, str):
+            if self._by_name is None:
+                self._by_name = {frame['name']: frame for frame in self.frames}
+            return self._by_name.get(key)
+        return self.frames[key]
+
+    def __getitem__(self, key):
+        """Keyed RGBA image of a sprite by index or name"""
+        frame = self.frame(key)
+        if frame is None:
+            raise KeyError(key)
+        return self.crop(frame['x'], frame['y'], frame['width'], frame['height'])
+
+    def crop(self, x, y, width, height, clear_color=None):
+        """Keyed crop of any rectangle of the sheet, served from the cache when possible"""
+        if clear_color is None:
+            clear_color = self.clear_color
+        key = (x, y, width, height, clear_color)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        sprite = self._cut(x, y, width, height, clear_color)
+        size = sprite.width * sprite.height * len(sprite.getbands())
+        if size <= self.cache_bytes:
+            self._cache[key] = sprite
+            self._cached_bytes += size
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= evicted.width * evicted.height * len(evicted.getbands())
+        return sprite
+
+    def _cut(self, x, y, width, height, clear_color):
+        """Key just the requested region rather than the whole sheet"""
+        analysis = self.analysis
+        if analysis.indexed or analysis.streaming:
+            return analysis.cut(x, y, width, height, clear_color)
+        region = (slice(y, y + height), slice(x, x + width))
+        keyed = key_pixels(analysis.pixels[region], analysis.mask[region], clear_color)
+        return Image.fromarray(keyed, 'RGBA')
+
+    def cache_info(self):
+        """Cache hits, misses, entries and bytes held"""
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._cache), 'bytes': self._cached_bytes}
+
+    def clear_cache(self):
+        """Drop every cached crop"""
+        self._cache.clear()
+        self._cached_bytes = 0
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Summed Area - Integral image over a foreground mask
+Built once per sheet with two cumulative sums; afterwards the number of
+foreground pixels in any rectangle is four lookups, so the content bounds
+inside a rectangle are found by binary search over those counts instead
+of scanning its pixels.
+"""
+
+import numpy as np
+
+class SummedAreaTable:
+    """
+    Content bounds of rectangles of a boolean mask from constant-time
+    foreground counts.
+
+    Rectangles are (x, y, width, height) in sheet pixels and are clipped
+    to the sheet.
+    """
+
+    def __init__(self, mask):
+        self.height, self.width = mask.shape
+        dtype = np.int32 if mask.size < 2**31 else np.int64
+        self.table = np.zeros((self.height + 1, self.width + 1), dtype=dtype)
+        np.cumsum(mask, axis=0, dtype=dtype, out=self.table[1:, 1:])
+        np.cumsum(self.table[1:, 1:], axis=1, out=self.table[1:, 1:])
+
+    def _clip(self, x, y, width, height):
+        """Half-open (x0, y0, x1, y1) of a rectangle clipped to the sheet"""
+        x0, y0 = min(max(0, x), self.width), min(max(0, y), self.height)
+        x1, y1 = min(self.width, x + width), min(self.height, y + height)
+        return x0, y0, max(x0, x1), max(y0, y1)
+
+    def _sum(self, x0, y0, x1, y1):
+        """Foreground pixels in the half-open rectangle [x0, x1) x [y0, y1)"""
+        t = self.table
+        return int(t[y1, x1] - t[y0, x1] - t[y1, x0] + t[y0, x0])
+
+    def content_bounds(self, x, y, width, height):
+        """
+        Tight box (min_x, min_y, max_x, max_y) around the foreground inside a
+        rectangle, or None when it is empty. Each edge is a binary search
+        over rectangle counts, so the cost is logarithmic in its size.
+        """
+        x0, y0, x1, y1 = self._clip(x, y, width, height)
+        if not self._sum(x0, y0, x1, y1):
+            return None
+
+        def first(lo, hi, has_content):
+            # Smallest i in [lo, hi) with has_content(i); has_content is monotone
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if has_content(mid):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            return lo
+
+        top = first(y0, y1, lambda i: self._sum(x0, y0, x1, i + 1) > 0)
+        bottom = y1 - 1 - first(0, y1 - y0, lambda i: self._sum(x0, y1 - 1 - i, x1, y1) > 0)
+        left = first(x0, x1, lambda i: self._sum(x0, y0, i + 1, y1) > 0)
+        right = x1 - 1 - first(0, x1 - x0, lambda i: self._sum(x1 - 1 - i, y0, x1, y1) > 0)
+        return left, top, right, bottom